@@ -0,0 +1,87 @@
+'''Measure the time and the peak memory used to parse Guitar Center product pages,
+building the whole page with html.parser (before) and only the parts that are read (after).
+
+Run it after a crawl to use the product pages saved in the cache:
+    python benchmark.py [number of pages]
+or give it product pages saved as files:
+    python benchmark.py page1.html page2.html ...
+'''
+import sys
+import time
+import tracemalloc
+import searcher
+
+
+def load_pages(args):
+    '''Load the product pages to parse
+
+    Parameters
+    ----------
+    args: list
+        The command line arguments, either the number of pages or the paths of saved pages
+
+    Returns
+    ----------
+    list
+        A list of (URL, HTML) tuples
+    '''
+    if len(args) > 0 and not args[0].isdigit():
+        pages = []
+        for filename in args:
+            with open(filename, 'r', encoding='utf-8') as page_file:
+                pages.append((filename, page_file.read()))
+        return pages
+    limit = int(args[0]) if len(args) > 0 else 100
+    cache = searcher.get_cache()
+    with cache.lock:
+        urls = [row[0] for row in cache.conn.execute('SELECT URL FROM Cache')]
+    urls = [url for url in urls if searcher.url_kind(url) == 'product'][:limit]
+    return [(url, cache[url]) for url in urls]
+
+
+def measure(pages, targeted):
+    '''Parse every page and measure it. The time is measured in a pass without tracemalloc,
+    which slows the parsing down several times, and the peak memory in a second pass.
+
+    Parameters
+    ----------
+    pages: list
+        A list of (URL, HTML) tuples
+
+    targeted: bool
+        Whether to build only the parts of the page that are read
+
+    Returns
+    ----------
+    tuple
+        The average seconds per page, the average peak bytes per page, and the parsed bass.info() lists
+    '''
+    seconds = 0
+    infos = []
+    for url, html in pages:
+        start = time.perf_counter()
+        instance = searcher.parse_bass_page(html, url, targeted)
+        seconds += time.perf_counter() - start
+        infos.append(instance.info() if instance is not None else None)
+    peak = 0
+    for url, html in pages:
+        tracemalloc.start()
+        searcher.parse_bass_page(html, url, targeted)
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds / len(pages), peak / len(pages), infos
+
+
+if __name__ == "__main__":
+    pages = load_pages(sys.argv[1:])
+    if len(pages) < 1:
+        print("No product page to parse, crawl some pages first or give saved pages")
+        sys.exit(1)
+    searcher.change_brandname_into_number("warm up")
+    print(len(pages), "pages, average size", sum(len(html) for url, html in pages) // len(pages), "characters")
+    before = measure(pages, False)
+    after = measure(pages, True)
+    print("%-32s %12s %14s" % ("", "ms per page", "peak KB/page"))
+    print("%-32s %12.2f %14.0f" % ("whole page, html.parser", before[0] * 1000, before[1] / 1024))
+    print("%-32s %12.2f %14.0f" % ("targeted, " + searcher.HTML_PARSER, after[0] * 1000, after[1] / 1024))
+    print("same results:", before[2] == after[2])
@@ -1,15 +1,130 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
 import requests
 import json
 import sqlite3
+import array
+import bisect
 import collections
+import datetime
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+import zoneinfo
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import plotly
 import plotly.graph_objects as go
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, g, has_app_context, abort, jsonify, Response
 import APIkey
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
 
-CACHE_FILENAME = "cache.json"
-CACHE_DICT = {}
+CACHE_FILENAME = "cache.sqlite"
+LEGACY_CACHE_FILENAME = "cache.json"
+CACHE_COMPRESS = True
+# Seconds a cached response stays fresh, for each kind of URL (see url_kind)
+CACHE_TTLS = {
+    'listing': 60 * 60 * 24,
+    'product': 60 * 60 * 24 * 3,
+    'wikipedia': 60 * 60 * 24 * 30,
+    'youtube': 60 * 60 * 24 * 7,
+    'other': 60 * 60 * 24,
+}
+CACHE_MAX_ENTRIES = 10000
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+# The number of cache hits whose last use is kept in memory before it is written to the cache file
+CACHE_FLUSH_EVERY = 500
+# Whether an expired page with an ETag or Last-Modified is checked with a conditional request instead of fetched again
+CACHE_REVALIDATE = True
+GC_BASE_URL = "https://www.guitarcenter.com"
+CRAWL_WORKERS = 8
+PARSE_WORKERS = os.cpu_count()
+# How the parsing processes are started: not by forking, which would copy the locks held by the fetching threads
+PARSE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+CRAWL_FILENAME = "crawl.sqlite"
+CRAWL_MAX_ATTEMPTS = 5
+# Seconds before the first retry of a failed page, doubled after each failure
+CRAWL_RETRY_DELAY = 30
+# Requests per second sent to one host
+CRAWL_RATE = 4.0
+# Seconds to connect and to wait for the response
+HTTP_TIMEOUT = (5, 30)
+HTTP_RETRIES = 3
+# Seconds before the first retry of a request, doubled after each retry
+HTTP_BACKOFF = 1.0
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+DB_FILENAME = "bassdb.sqlite"
+DB_POOL_SIZE = 5
+DB_JOURNAL_MODE = "WAL"
+DB_BUSY_TIMEOUT = 10.0
+DB_STATEMENT_CACHE = 128
+# Rows inserted per transaction by the bulk loading, None for one transaction
+BULK_CHUNK_SIZE = 500
+# Quota units the YouTube API gives per day, and the units one search costs
+YOUTUBE_DAILY_QUOTA = 10000
+YOUTUBE_SEARCH_COST = 100
+# The time zone the days of the YouTube API quota are counted in
+YOUTUBE_QUOTA_TIMEZONE = zoneinfo.ZoneInfo('America/Los_Angeles')
+YOUTUBE_WORKERS = 4
+# Seconds before the video found for a bass is looked up again
+VIDEO_TTL = 30 * 24 * 60 * 60
+# Seconds before a failed video lookup is tried again, doubled after each failure up to VIDEO_TTL
+VIDEO_RETRY_DELAY = 60 * 60
+CACHE_STORE = None
+CACHE_STORE_LOCK = threading.Lock()
+BRAND_MATCHER = None
+FTS_ENABLED = None
+DB_PREPARE_LOCK = threading.Lock()
+# The catalog generation and the JSON of the charts of the brands analysis page built for it
+CHART_CACHE = None
+# Raise it when the charts change, so the charts stored by an older version are built again
+CHART_VERSION = 2
+PAGE_SIZE = 30
+# The number of searches whose results are kept in memory
+SEARCH_CACHE_SIZE = 256
+# Whether the searches without keywords are answered from a copy of the catalog kept in memory
+CATALOG_SNAPSHOT = True
+CATALOG = None
+CATALOG_LOCK = threading.Lock()
+# The lowest trigram similarity for a misspelled keyword to be replaced by a word of the names
+FUZZY_THRESHOLD = 0.3
+AUTOCOMPLETE_LIMIT = 10
+NAME_INDEX = None
+NAME_INDEX_LOCK = threading.Lock()
+SORT_ORDERS = {
+    'relevance': None,
+    'price_asc': ('Price', 'ASC'),
+    'price_desc': ('Price', 'DESC'),
+    'name': ('Basses.ModelName', 'ASC'),
+}
+# Names of the brand countries counted as another country in the brands analysis
+COUNTRY_NAMES = {
+    "United States of America": "United States",
+    "US": "United States",
+    "USA": "United States",
+    "American": "United States",
+    "England": "United Kingdom",
+    "UK": "United Kingdom",
+    "": "N/A",
+}
+# Brands with this many basses or fewer are left out of the brands analysis
+MIN_BRAND_BASSES = 5
+# The body types a category can name, the first one found in the category wins
+BODY_TYPES = ('Upright', 'Acoustic', 'Electric')
+# Basses with this many strings or more are counted together, like the "6+ String" categories
+MAX_STRING_COUNT = 6
+# BM25 weights of ModelName, BrandName, Styles, Description and Features in the search index
+SEARCH_WEIGHTS = (10.0, 8.0, 2.0, 1.5, 1.0)
 API_KEY = APIkey.YOUTUBE_API_KEY
 app = Flask(__name__)
 
@@ -48,6 +163,12 @@ class bass():
 
     URL: string
         A link to the product page
+
+    body_type: string or None
+        "Electric", "Acoustic" or "Upright", read from the category
+
+    string_count: int or None
+        The number of strings read from the category, MAX_STRING_COUNT for 6 strings or more
     '''
     
     def __init__(self, product_name, brand, other_brand, category, price, styles, description, features, picURL, URL):
@@ -61,6 +182,7 @@ class bass():
         self.category = category
         self.features = features
         self.URL = URL
+        self.body_type, self.string_count = parse_category(category)
 
     def info(self):
         '''Report a list of basic information of the bass
@@ -73,7 +195,7 @@ class bass():
         ----------
         A list of basic information of the bass
         '''
-        return [self.product_name, self.brand, self.other_brand, self.category, self.price, self.styles, self.description, self.features, self.picURL, self.URL]
+        return [self.product_name, self.brand, self.other_brand, self.category, self.price, self.styles, self.description, self.features, self.picURL, self.URL, self.body_type, self.string_count]
 
 
 class brand():
@@ -115,91 +237,336 @@ class brand():
 
 
 # Functions in this part work on the caching
-def open_cache():
-    ''' Opens the cache file if it exists and loads the JSON into the CACHE_DICT dictionary.
-    if the cache file doesn't exist, creates a new cache dictionary
-    
-    Parameters
-    ----------
-    None
-    
-    Returns
-    -------
-    The opened cache: dict
-    '''
-    try:
-        cache_file = open(CACHE_FILENAME, 'r')
-        cache_contents = cache_file.read()
-        cache_dict = json.loads(cache_contents)
-        cache_file.close()
-    except:
-        cache_dict = {}
-    return cache_dict
+class cache_store():
+    '''An on-disk cache of the responses, one row per URL in a SQLite file.
+    Entries are read when they are looked up and written one at a time, so neither
+    opening the cache nor saving a response touches the other entries.
+    An entry older than the TTL of its kind of URL is treated as missing, and the least
+    recently used entries are evicted when the cache has too many entries or bytes.
+    The last use of the entries is kept in memory and written in one transaction before
+    an eviction, every CACHE_FLUSH_EVERY hits, or when flush is called, so a hit does not
+    wait for the disk.
 
+    Instance Attributes
+    -------------------
+    filename: string
+        The path of the cache file
 
-def save_cache(cache_dict):
-    ''' Saves the current state of the cache to disk
-    
-    Parameters
-    ----------
-    cache_dict: dict
-        The dictionary to save
-    
-    Returns
-    -------
-    None
-    '''
-    dumped_json_cache = json.dumps(cache_dict)
-    fw = open(CACHE_FILENAME,"w")
-    fw.write(dumped_json_cache)
-    fw.close() 
+    compress: bool
+        Whether new entries are stored compressed with zlib
 
-# Functions in this part work on web scrapping 
-def make_request(url):
-    '''Make a request to the Web using the url
-    
-    Parameters
-    ----------
-    url: string
-        The URL for the API/scrapping endpoint
-    
-    Returns
-    -------
-    dict
-        the data returned from making the request in the form of a dictionary
+    ttls: dict
+        The seconds an entry stays fresh, with the kinds of URL as keys
+
+    max_entries: int
+        The maximum number of entries kept
+
+    max_bytes: int
+        The maximum total size of the stored bodies
+
+    counters: dict
+        The number of hits, misses, expired entries and evictions since the cache was opened
+
+    last_used: dict
+        The time of the hits not yet written to the cache file, with the URLs as keys
     '''
-    if "https://www.googleapis.com/youtube/v3/search" in url:
-        response = requests.get(url).json()
-    else:
-        response = requests.get(url).text
-    return response
 
+    def __init__(self, filename, compress=CACHE_COMPRESS, ttls=CACHE_TTLS, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.filename = filename
+        self.compress = compress
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'revalidated': 0, 'evictions': 0}
+        self.last_used = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS "Cache" (
+                "URL" TEXT PRIMARY KEY,
+                "Body" BLOB NOT NULL,
+                "IsJSON" INTEGER NOT NULL,
+                "Compressed" INTEGER NOT NULL,
+                "FetchedAt" REAL NOT NULL
+            )
+        ''')
+        columns = [column[1] for column in self.conn.execute('PRAGMA table_info(Cache)')]
+        if 'LastUsed' not in columns:
+            self.conn.execute('ALTER TABLE Cache ADD COLUMN "LastUsed" REAL NOT NULL DEFAULT 0')
+            self.conn.execute('ALTER TABLE Cache ADD COLUMN "Size" INTEGER NOT NULL DEFAULT 0')
+            self.conn.execute('UPDATE Cache SET LastUsed = FetchedAt, Size = LENGTH(Body)')
+        if 'ETag' not in columns:
+            self.conn.execute('ALTER TABLE Cache ADD COLUMN "ETag" TEXT')
+            self.conn.execute('ALTER TABLE Cache ADD COLUMN "LastModified" TEXT')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS "Cache_LastUsed" ON Cache (LastUsed)')
+        self.conn.commit()
+        totals = self.conn.execute('SELECT COUNT(*), IFNULL(SUM(Size), 0) FROM Cache').fetchone()
+        self.entries = totals[0]
+        self.bytes = totals[1]
 
-def make_request_with_cache(url):
-    '''Check the cache for a saved result for this url. If the result is found, return it. Otherwise send a new request, save it, then return it.
+    def __contains__(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT FetchedAt FROM Cache WHERE URL = ?', (url,)).fetchone()
+        return row is not None and not self.is_expired(url, row[0])
+
+    def __getitem__(self, url):
+        entry = self.get_entry(url)
+        if entry is None or not entry[1]:
+            raise KeyError(url)
+        return entry[0]
+
+    def __setitem__(self, url, response):
+        self.store(url, response)
+
+    def get_entry(self, url):
+        '''Look up an entry, fresh or expired
+
+        Parameters
+        ----------
+        url: string
+            The URL of the entry
+
+        Returns
+        ----------
+        tuple or None
+            The response, whether it is still fresh, its ETag and its Last-Modified. None if the URL is not in the cache.
+        '''
+        with self.lock:
+            row = self.conn.execute('SELECT Body, IsJSON, Compressed, FetchedAt, ETag, LastModified FROM Cache WHERE URL = ?', (url,)).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            fresh = not self.is_expired(url, row[3])
+            if fresh:
+                self.counters['hits'] += 1
+                self.last_used[url] = time.time()
+                if len(self.last_used) >= CACHE_FLUSH_EVERY:
+                    with self.conn:
+                        self.write_last_used()
+            else:
+                self.counters['misses'] += 1
+                self.counters['expired'] += 1
+        body = zlib.decompress(row[0]) if row[2] else row[0]
+        body = body.decode('utf-8')
+        if row[1]:
+            body = json.loads(body)
+        return (body, fresh, row[4], row[5])
+
+    def store(self, url, response, etag=None, last_modified=None):
+        '''Save a response, with the validators the server sent for it
+
+        Parameters
+        ----------
+        url: string
+            The URL of the response
+
+        response: string or dict
+            The HTML page or the decoded JSON
+
+        etag: string or None
+            The ETag header of the response
+
+        last_modified: string or None
+            The Last-Modified header of the response
+
+        Returns
+        ----------
+        None
+        '''
+        is_json = not isinstance(response, str)
+        body = (json.dumps(response) if is_json else response).encode('utf-8')
+        if self.compress:
+            body = zlib.compress(body)
+        now = time.time()
+        with self.lock:
+            with self.conn:
+                old = self.conn.execute('SELECT Size FROM Cache WHERE URL = ?', (url,)).fetchone()
+                if old is not None:
+                    self.entries -= 1
+                    self.bytes -= old[0]
+                self.conn.execute('''
+                    INSERT OR REPLACE INTO Cache (URL, Body, IsJSON, Compressed, FetchedAt, LastUsed, Size, ETag, LastModified)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (url, body, int(is_json), int(self.compress), now, now, len(body), etag, last_modified))
+                self.entries += 1
+                self.bytes += len(body)
+                self.last_used.pop(url, None)
+                self.evict()
+
+    def revalidated(self, url):
+        '''Mark an expired entry fresh again, after the server answered 304 Not Modified
+
+        Parameters
+        ----------
+        url: string
+            The URL of the entry
+
+        Returns
+        ----------
+        None
+        '''
+        now = time.time()
+        with self.lock:
+            self.counters['revalidated'] += 1
+            self.last_used.pop(url, None)
+            with self.conn:
+                self.conn.execute('UPDATE Cache SET FetchedAt = ?, LastUsed = ? WHERE URL = ?', (now, now, url))
+
+    def __delitem__(self, url):
+        with self.lock:
+            with self.conn:
+                old = self.conn.execute('SELECT Size FROM Cache WHERE URL = ?', (url,)).fetchone()
+                if old is None:
+                    raise KeyError(url)
+                self.conn.execute('DELETE FROM Cache WHERE URL = ?', (url,))
+                self.last_used.pop(url, None)
+                self.entries -= 1
+                self.bytes -= old[0]
+
+    def __len__(self):
+        return self.entries
+
+    def is_expired(self, url, fetched_at):
+        '''Check if an entry is older than the TTL of its kind of URL
+
+        Parameters
+        ----------
+        url: string
+            The URL of the entry
+
+        fetched_at: float
+            The time the entry was saved
+
+        Returns
+        ----------
+        bool
+            True if the entry is expired
+        '''
+        ttl = self.ttls.get(url_kind(url), self.ttls.get('other'))
+        return ttl is not None and time.time() - fetched_at > ttl
+
+    def evict(self):
+        '''Delete the least recently used entries until the cache is within its bounds.
+        Called with the lock held, inside a transaction.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+        '''
+        if self.entries > self.max_entries or self.bytes > self.max_bytes:
+            self.write_last_used()
+        while self.entries > self.max_entries or self.bytes > self.max_bytes:
+            oldest = self.conn.execute('SELECT URL, Size FROM Cache ORDER BY LastUsed LIMIT 100').fetchall()
+            if len(oldest) < 1:
+                break
+            for url, size in oldest:
+                if self.entries <= self.max_entries and self.bytes <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM Cache WHERE URL = ?', (url,))
+                self.entries -= 1
+                self.bytes -= size
+                self.counters['evictions'] += 1
+
+    def flush(self):
+        '''Write the last use of the entries kept in memory to the cache file
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+        '''
+        with self.lock:
+            with self.conn:
+                self.write_last_used()
+
+    def write_last_used(self):
+        '''Write the last use of the entries kept in memory.
+        Called with the lock held, inside a transaction.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+        '''
+        self.conn.executemany('UPDATE Cache SET LastUsed = ? WHERE URL = ?', [(used, url) for url, used in self.last_used.items()])
+        self.last_used.clear()
+
+    def stats(self):
+        '''Report how the cache is doing, to tune the TTLs and the bounds
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        dict
+            The counters, plus the number of entries and bytes in the cache
+        '''
+        report = dict(self.counters)
+        report['entries'] = self.entries
+        report['bytes'] = self.bytes
+        return report
+
+    def import_json(self, filename):
+        '''Copy the entries of an old cache.json file into the cache
+
+        Parameters
+        ----------
+        filename: string
+            The path of the JSON cache file
+
+        Returns
+        ----------
+        int
+            The number of entries copied
+        '''
+        with open(filename, 'r') as cache_file:
+            cache_dict = json.load(cache_file)
+        for url, response in cache_dict.items():
+            self[url] = response
+        return len(cache_dict)
+
+
+def url_kind(url):
+    ''' Tell which kind of page a URL points to, to pick its TTL in the cache
     
     Parameters
     ----------
     url: string
-        The URL for the API endpoint
+        The URL
     
     Returns
     -------
-    dict
-        the results of the query as a dictionary loaded from cache JSON
+    string
+        "listing", "product", "wikipedia", "youtube" or "other"
     '''
-    if url in CACHE_DICT.keys():
-        print("Using Cache")
-        return CACHE_DICT[url]
-    else:
-        print("Fetching", url)
-        CACHE_DICT[url] = make_request(url)
-        save_cache(CACHE_DICT)
-        return CACHE_DICT[url]
+    if "googleapis.com/youtube" in url:
+        return 'youtube'
+    if "wikipedia.org" in url:
+        return 'wikipedia'
+    if "guitarcenter.com" in url:
+        if "/Bass.gc" in url:
+            return 'listing'
+        return 'product'
+    return 'other'
 
 
-def get_basses():
-    '''Get the name and the URL of all basses from Guitar Center online shop
+def open_cache():
+    ''' Opens the cache file, creating it if it doesn't exist.
+    If the cache is empty and an old cache.json file exists, its entries are copied into the cache.
     
     Parameters
     ----------
@@ -207,551 +574,3760 @@ def get_basses():
     
     Returns
     -------
-    dict
-        A dictionary having names of the basss as keys, and url of the product page as values
+    The opened cache: cache_store
     '''
-    baseurl = "https://www.guitarcenter.com"
-    response = make_request_with_cache("https://www.guitarcenter.com/Bass.gc")
-    soup = BeautifulSoup(response, 'html.parser')
-    match = soup.find('div', class_='results-options--option -matches').var.text.replace(',','')
-    bass_link = {}
-    for i in range(int(int(match)/30)+1):
-        newurl = "https://www.guitarcenter.com/Bass.gc?Nao=" +str(30*i)
-        response = make_request_with_cache(newurl)
-        newsoup = BeautifulSoup(response, 'html.parser')
-        results = newsoup.find('div', id="resultsContent").find_all('div', class_="product")
-        for product in results:
-            product_name = product.find('div', class_='productTitle').text.strip()
-            productURL = product.find('div', class_='productTitle').a['href']
-            bass_link[product_name] = baseurl + productURL
-        
-    return bass_link
+    cache = cache_store(CACHE_FILENAME)
+    if len(cache) == 0 and os.path.exists(LEGACY_CACHE_FILENAME):
+        try:
+            cache.import_json(LEGACY_CACHE_FILENAME)
+        except ValueError:
+            pass
+    return cache
 
 
-def get_bass_instance(site_url):
-    '''Make an instances from a Guitar Center product page.
+def get_cache():
+    ''' Get the cache of the process, opening it the first time it is used.
+    The fetching threads share it, so only one of them opens it.
     
     Parameters
     ----------
-    site_url: string
-        The URL for a product page in Guitar Center
+    None
     
     Returns
     -------
-    instance
-        a bass instance
+    The opened cache: cache_store
     '''
-    response = make_request_with_cache(site_url)
-    soup = BeautifulSoup(response, 'html.parser')
-    if soup.find('div', class_='titleWrap') is None:
-        pass
-    else:
-        product_name = soup.find('div', class_='titleWrap').text.lstrip()
-        brandname = soup.find('div', class_='titleWrap').find('span', class_='brand').text
-        brand_and_other = change_brandname_into_number(brandname)
-        brand = brand_and_other[0]
-        other_brand = brand_and_other[1]
-        picURL = soup.find('div', class_='product-left').find('img')['src']
-        try:
-            price = float(soup.find('span', class_='topAlignedPrice').text.strip().strip('$').replace(',', ''))
-        except:
-            price = None
-
-        try:
-            description = soup.find('section', id='product-overview').find('p', class_='description').text
-        except:
-            description = None
-        
-        styleslist = []
-        styles = ''
-        allstyles = soup.find('div', id='chooseStyleWrap').find_all('li')
-        for style in allstyles:
-            stylename = style.find('div', class_='styleLabel').text
-            styleslist.append(stylename)
-        styles = ', '.join(styleslist)
-        if len(styleslist) < 1:
-            stylename = soup.find('div', class_='titleWrap').find('span', class_='skuStyle').text
-            styles = stylename
-        
-        try:
-            category = soup.find_all('a', class_='category')[2].text
-        except:
-            category = soup.find_all('a', class_='category')[1].text
+    global CACHE_STORE
+    with CACHE_STORE_LOCK:
+        if CACHE_STORE is None:
+            CACHE_STORE = open_cache()
+        return CACHE_STORE
 
-        try:
-            uls = soup.find('div', class_='specs').find_all('ul')
-            featureslist = []
-            for ul in uls:
-                lis = ul.find_all('li')
-                for li in lis:
-                    featureslist.append(li.text.strip())
-            features = ' \n '.join(featureslist)
-        except:
-            features = None
-        return bass(product_name, brand, other_brand, category, price, styles, description, features, picURL, site_url)
 
+class search_cache():
+    '''The results of the latest searches, kept in memory for the catalog generation they were
+    found in. The least recently used search is dropped when there are too many of them, and
+    all of them are dropped when the catalog generation changes.
 
-def change_brandname_into_number(brandname):
-    '''Change the brand name into id.
-    
-    Parameters
-    ----------
-    brandname: string
-        The name of the brand
-    
-    Returns
-    -------
-    int or string
-        The id of the brand, return the original brandname if the id is not available
-    '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
-    read_brand_db='''
-    SELECT BrandId, BrandName
-    FROM brands
-    '''
-    brandlist = cur.execute(read_brand_db)
-    for brand in brandlist:
-        if brand[1].lower() in brandname.lower():
-            brandcode = brand[0]
-    conn.close()
-    try:
-        return (int(brandcode), None)
-    except:
-        return (0, brandname)
+    Instance Attributes
+    -------------------
+    max_entries: int
+        The maximum number of searches kept
 
+    generation: int or None
+        The catalog generation of the searches kept
 
-def get_youtube_video_url(bassname):
-    '''Get the youtube video URL for the bass
-    
-    Parameters
-    ----------
-    bassname: string
-        The name of the bass
-    
-    Returns
-    -------
-    string or None
-        URL of the youtube page. return None if there is no result.
+    counters: dict
+        The number of hits, misses and evictions since the cache was created
     '''
-    base_url = "https://www.googleapis.com/youtube/v3/search?"
-    bassname = "%20".join(bassname.split(" "))
-    query = str(base_url + "part=snippet&maxResults=1&q=" + bassname + "&key=" + API_KEY)
-    response = make_request_with_cache(query)
-    print(response)
-    try:
-        finalreturns = str(response['items'][0]['id']['videoId'])
-    except: finalreturns = None
-    return finalreturns
 
+    def __init__(self, max_entries=SEARCH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.generation = None
+        self.entries = collections.OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.lock = threading.Lock()
 
-def get_brands():
-    '''Get the name and the URL of all brands from Wikipedia "List of Guitar Manufacturers" page.
-    
-    Parameters
-    ----------
-    None
-    
-    Returns
-    -------
-    dict
-        A dictionary having names of the brands as keys, and url of the Wikipedia page as values
-    '''
-    baseurl = "https://en.wikipedia.org"
-    url = "https://en.wikipedia.org/wiki/List_of_guitar_manufacturers"
-    response = requests.get(url).text
-    soup = BeautifulSoup(response, 'html.parser')
-    brand_link = {}
-    results = soup.find('div', class_="div-col columns column-width").find_all('li')
-    for brand in results:
-        brand_name = brand.find('a').text
-        brandURL = brand.find('a')['href']
-        brand_link[brand_name] = baseurl + brandURL
-    return brand_link
+    def get(self, key, generation):
+        '''Look up the results of a search
+
+        Parameters
+        ----------
+        key: tuple
+            The normalized criteria of the search
+
+        generation: int
+            The current catalog generation
+
+        Returns
+        -------
+        tuple or None
+            The results saved for the search, None if they are missing
+        '''
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            if key not in self.entries:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return self.entries[key]
+
+    def put(self, key, generation, results):
+        '''Save the results of a search, unless the catalog changed while they were found
+
+        Parameters
+        ----------
+        key: tuple
+            The normalized criteria of the search
+
+        generation: int
+            The catalog generation the results were found in
+
+        results: tuple
+            The results of the search
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = results
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        '''Drop all the searches
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.generation = None
+
+    def stats(self):
+        '''Get the counters and the number of searches kept
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            The counters, with the number of "entries" added
+        '''
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        return stats
+
+
+SEARCH_CACHE = search_cache()
+
+# Functions in this part work on web scrapping 
+class page_strainer(SoupStrainer):
+    '''A SoupStrainer keeping only the tags having one of the wanted classes or ids,
+    together with everything inside them. Works with both the old and the new
+    (4.13 and later) ways BeautifulSoup asks a strainer about a tag.
+
+    Instance Attributes
+    -------------------
+    classes: set
+        The wanted classes
+
+    ids: set
+        The wanted ids
+    '''
+
+    def __init__(self, classes, ids):
+        SoupStrainer.__init__(self)
+        self.classes = set(classes)
+        self.ids = set(ids)
+
+    def wanted(self, attrs):
+        '''Check if a tag has one of the wanted classes or ids
+
+        Parameters
+        ----------
+        attrs: dict
+            The attributes of the tag
+
+        Returns
+        ----------
+        bool
+            True if the tag is wanted
+        '''
+        if not attrs:
+            return False
+        if attrs.get('id') in self.ids:
+            return True
+        classes = attrs.get('class') or []
+        if isinstance(classes, str):
+            classes = classes.split()
+        for tag_class in classes:
+            if tag_class in self.classes:
+                return True
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.wanted(attrs)
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        if isinstance(markup_name, Tag):
+            return markup_name if self.wanted(markup_name.attrs) else None
+        return markup_name if self.wanted(dict(markup_attrs)) else None
+
+
+PRODUCT_STRAINER = page_strainer(['titleWrap', 'product-left', 'topAlignedPrice', 'category', 'specs'], ['product-overview', 'chooseStyleWrap'])
+LISTING_STRAINER = page_strainer(['results-options--option'], ['resultsContent'])
+
+
+class rate_limiter():
+    '''A token bucket for each host, so the requests sent to one host stay under a rate
+    no matter how many threads are fetching. Used by the fetcher.
+
+    Instance Attributes
+    -------------------
+    rate: float
+        The number of requests per second allowed for each host, None for no limit
+
+    burst: int
+        The number of requests a host can get at once after being idle
+    '''
+
+    def __init__(self, rate=CRAWL_RATE, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        '''Block until a request to the host of the url is allowed
+
+        Parameters
+        ----------
+        url: string
+            The URL about to be requested
+
+        Returns
+        ----------
+        None
+        '''
+        if not self.rate:
+            return
+        host = urllib.parse.urlsplit(url).netloc
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+
+
+class fetcher():
+    '''Sends the HTTP requests of the scrapping and of the YouTube lookup. Each host gets
+    one session keeping its connections alive, requests to a host are rate limited,
+    and failed requests are retried, waiting longer after each failure.
+
+    Instance Attributes
+    -------------------
+    timeout: tuple
+        The seconds to connect and to wait for the response
+
+    retries: int
+        The number of times a failed request is sent again
+
+    backoff: float
+        The seconds before the first retry, doubled after each retry
+
+    pool_size: int
+        The number of connections kept alive for each host
+
+    limiter: rate_limiter
+        The rate limit of each host
+
+    metrics: dict
+        The number of requests, errors, retries and the seconds spent, with the hosts as keys
+    '''
+
+    def __init__(self, timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, rate=CRAWL_RATE, pool_size=CRAWL_WORKERS):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.limiter = rate_limiter(rate)
+        self.sessions = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def session(self, host):
+        '''Get the session of a host, creating it the first time
+
+        Parameters
+        ----------
+        host: string
+            The host name
+
+        Returns
+        ----------
+        requests.Session
+            The session of the host
+        '''
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.metrics[host] = {'requests': 0, 'errors': 0, 'retries': 0, 'seconds': 0.0, 'slowest': 0.0}
+            return self.sessions[host]
+
+    def record(self, host, seconds, error=False, retry=False):
+        with self.lock:
+            metrics = self.metrics[host]
+            metrics['requests'] += 1
+            metrics['seconds'] += seconds
+            metrics['slowest'] = max(metrics['slowest'], seconds)
+            if error:
+                metrics['errors'] += 1
+            if retry:
+                metrics['retries'] += 1
+
+    def get(self, url, headers=None):
+        '''Send a GET request, retrying on connection errors, timeouts and 429/5xx answers
+
+        Parameters
+        ----------
+        url: string
+            The URL
+
+        headers: dict or None
+            The headers of the request
+
+        Returns
+        ----------
+        requests.Response
+            The last response received
+
+        Raises
+        ----------
+        requests.RequestException
+            If the request still fails after all the retries
+        '''
+        host = urllib.parse.urlsplit(url).netloc
+        session = self.session(host)
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            delay = self.backoff * 2 ** attempt
+            self.limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                reply = session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                self.record(host, time.perf_counter() - start, error=True, retry=not last_attempt)
+                if last_attempt:
+                    raise
+                time.sleep(delay)
+                continue
+            failed = reply.status_code in HTTP_RETRY_STATUSES
+            self.record(host, time.perf_counter() - start, error=reply.status_code >= 400, retry=failed and not last_attempt)
+            if not failed or last_attempt:
+                return reply
+            retry_after = reply.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+
+    def stats(self):
+        '''Report the requests sent to each host
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        dict
+            The number of requests, errors and retries and the average and slowest seconds, with the hosts as keys
+        '''
+        report = {}
+        with self.lock:
+            for host, metrics in self.metrics.items():
+                report[host] = dict(metrics)
+                report[host]['average'] = metrics['seconds'] / metrics['requests'] if metrics['requests'] else 0
+        return report
+
+
+FETCHER = fetcher()
+
+
+class brand_matcher():
+    '''Finds the brands named in a text in a single pass over it, with an Aho-Corasick
+    automaton built from the names of the brands. Case is ignored.
+    Built once per process from the Brands table (see get_brand_matcher) and shared by all the
+    product pages parsed in it, to find the brand of each bass.
+
+    Instance Attributes
+    -------------------
+    brands: dict
+        The names of the brands, with the ids of the brands as keys
+
+    goto: list
+        The transitions of each state of the automaton, as dictionaries from characters to states
+
+    fail: list
+        The state to fall back to from each state when the next character has no transition
+
+    output: list
+        The (length, brand id) of the brands ending at each state
+    '''
+
+    def __init__(self, brands):
+        self.brands = {}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for brand_id, brand_name in brands:
+            if not brand_name or not brand_name.strip():
+                continue
+            self.brands[brand_id] = brand_name
+            state = 0
+            for char in brand_name.lower():
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(brand_name), brand_id))
+        pending = collections.deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self.goto[state].items():
+                pending.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        '''Find every brand named in a text
+
+        Parameters
+        ----------
+        text: string
+            The text to search in
+
+        Returns
+        ----------
+        list
+            A list of (start, end, brand id) of the brands found, in the order they end in the text
+        '''
+        found = []
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, brand_id in self.output[state]:
+                found.append((position + 1 - length, position + 1, brand_id))
+        return found
+
+    def best_match(self, text):
+        '''Find the most specific brand named in a text, which is the longest one,
+        or the first one if there are several of the same length
+
+        Parameters
+        ----------
+        text: string
+            The text to search in
+
+        Returns
+        ----------
+        int or None
+            The id of the brand, None if no brand is named in the text
+        '''
+        best = None
+        for start, end, brand_id in self.find_all(text):
+            if best is None or end - start > best[1] - best[0] or (end - start == best[1] - best[0] and start < best[0]):
+                best = (start, end, brand_id)
+        if best is None:
+            return None
+        return best[2]
+
+
+def get_brand_matcher():
+    '''Get the brand matcher of the process, building it from the Brands table the first time it is used
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    brand_matcher
+        The matcher of all the brands
+    '''
+    global BRAND_MATCHER
+    if BRAND_MATCHER is None:
+        cur = get_db().cursor()
+        read_brand_db='''
+        SELECT BrandId, BrandName
+        FROM Brands
+        '''
+        BRAND_MATCHER = brand_matcher(cur.execute(read_brand_db).fetchall())
+    return BRAND_MATCHER
+
+
+def make_request(url, etag=None, last_modified=None):
+    '''Make a request to the Web using the url. If validators of a cached copy are given,
+    the request is conditional and the server can answer that the page did not change.
+    
+    Parameters
+    ----------
+    url: string
+        The URL for the API/scrapping endpoint
+
+    etag: string or None
+        The ETag of the cached copy
+
+    last_modified: string or None
+        The Last-Modified of the cached copy
+    
+    Returns
+    -------
+    tuple
+        the data returned from making the request (a dictionary for the API, the HTML otherwise,
+        None if the page did not change), and the ETag and Last-Modified of the response
+
+    Raises
+    -------
+    requests.RequestException
+        If the request failed, or the server answered with an error
+    '''
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    reply = FETCHER.get(url, headers=headers)
+    if reply.status_code == 304:
+        return None, etag, last_modified
+    reply.raise_for_status()
+    if "https://www.googleapis.com/youtube/v3/search" in url:
+        response = reply.json()
+    else:
+        response = reply.text
+    return response, reply.headers.get('ETag'), reply.headers.get('Last-Modified')
+
+
+def make_request_with_cache(url):
+    '''Check the cache for a saved result for this url. If the result is found and fresh, return it.
+    If it is expired and the server gave validators for it, ask the server if it changed, and
+    keep the saved result if it did not. Otherwise send a new request, save it, then return it.
+    
+    Parameters
+    ----------
+    url: string
+        The URL for the API endpoint
+    
+    Returns
+    -------
+    dict or string
+        the results of the query, loaded from the cache if it was there
+    '''
+    cache = get_cache()
+    entry = cache.get_entry(url)
+    if entry is not None and entry[1]:
+        print("Using Cache")
+        return entry[0]
+    if entry is not None and CACHE_REVALIDATE and (entry[2] or entry[3]):
+        print("Revalidating", url)
+        response, etag, last_modified = make_request(url, entry[2], entry[3])
+        if response is None:
+            cache.revalidated(url)
+            return entry[0]
+    else:
+        print("Fetching", url)
+        response, etag, last_modified = make_request(url)
+    cache.store(url, response, etag, last_modified)
+    return response
+
+
+def get_basses(base_url=GC_BASE_URL, max_workers=1):
+    '''Get the name and the URL of all basses from Guitar Center online shop.
+    The listing pages after the first one are fetched by max_workers threads.
+    
+    Parameters
+    ----------
+    base_url: string
+        The address of the online shop, it can point to a local copy of it
+
+    max_workers: int
+        The number of listing pages fetched at the same time
+    
+    Returns
+    -------
+    dict
+        A dictionary having names of the basss as keys, and url of the product page as values
+    '''
+    newurls = get_listing_urls(base_url)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(make_request_with_cache, newurls))
+    bass_link = {}
+    for response in responses:
+        bass_link.update(parse_listing_page(response, base_url))
+    return bass_link
+
+
+def get_listing_urls(base_url=GC_BASE_URL):
+    '''Get the URLs of all the listing pages of basses, 30 basses per page
+    
+    Parameters
+    ----------
+    base_url: string
+        The address of the online shop, it can point to a local copy of it
+    
+    Returns
+    -------
+    list
+        The URLs of the listing pages
+    '''
+    response = make_request_with_cache(base_url + "/Bass.gc")
+    soup = BeautifulSoup(response, HTML_PARSER, parse_only=LISTING_STRAINER)
+    match = soup.find('div', class_='results-options--option -matches').var.text.replace(',','')
+    return [base_url + "/Bass.gc?Nao=" + str(30*i) for i in range(int(int(match)/30)+1)]
+
+
+def parse_listing_page(response, base_url=GC_BASE_URL):
+    '''Get the name and the URL of the basses on a listing page
+    
+    Parameters
+    ----------
+    response: string
+        The HTML of the listing page
+
+    base_url: string
+        The address of the online shop
+    
+    Returns
+    -------
+    dict
+        A dictionary having names of the basss as keys, and url of the product page as values
+    '''
+    bass_link = {}
+    newsoup = BeautifulSoup(response, HTML_PARSER, parse_only=LISTING_STRAINER)
+    results = newsoup.find('div', id="resultsContent").find_all('div', class_="product")
+    for product in results:
+        product_name = product.find('div', class_='productTitle').text.strip()
+        productURL = product.find('div', class_='productTitle').a['href']
+        bass_link[product_name] = base_url + productURL
+    return bass_link
+
+
+def parser_pool(parse_workers):
+    '''Create the pool of processes parsing the pages. The processes are started with
+    PARSE_START_METHOD, since a forked process could copy a lock held at that moment by
+    one of the threads fetching the pages and wait for it forever.
+    A started process imports the module again and does not see the database set by
+    configure_db, so it is given the brands of this process to find the brand of each bass.
+    
+    Parameters
+    ----------
+    parse_workers: int
+        The number of processes parsing the pages
+    
+    Returns
+    -------
+    ProcessPoolExecutor
+        The pool of processes
+    '''
+    brands = list(get_brand_matcher().brands.items())
+    return ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+                               initializer=set_brand_matcher, initargs=(brands,))
+
+
+def set_brand_matcher(brands):
+    '''Build the brand matcher of a parsing process from the brands of the process that started it
+    
+    Parameters
+    ----------
+    brands: list
+        The (id, name) of the brands
+    
+    Returns
+    -------
+    None
+    '''
+    global BRAND_MATCHER
+    BRAND_MATCHER = brand_matcher(brands)
+
+
+def get_bass_infos(site_urls, max_workers=CRAWL_WORKERS, parse_workers=PARSE_WORKERS):
+    '''Get the information of the basses on many Guitar Center product pages.
+    The pages are fetched by max_workers threads, and each page is handed to a pool of
+    parse_workers processes as soon as it arrives, so parsing runs on every core.
+    A page that fails is reported and skipped.
+    
+    Parameters
+    ----------
+    site_urls: list
+        The URLs of the product pages
+
+    max_workers: int
+        The number of product pages fetched at the same time
+
+    parse_workers: int
+        The number of processes parsing the pages
+    
+    Returns
+    -------
+    list
+        The bass.info() lists of the basses, in the order of the URLs, a URL listed twice
+        giving one bass
+    '''
+    site_urls = list(dict.fromkeys(site_urls))
+    parsing = []
+    with ThreadPoolExecutor(max_workers=max_workers) as fetchers, parser_pool(parse_workers) as parsers:
+        for site_url, response in zip(site_urls, fetchers.map(fetch_page, site_urls)):
+            if response is not None:
+                parsing.append((site_url, parsers.submit(parse_bass_info, response, site_url)))
+        infos = []
+        for site_url, future in parsing:
+            try:
+                info = future.result()
+            except Exception as error:
+                print("Failed", site_url, error)
+                continue
+            if info is not None:
+                infos.append(info)
+    return infos
+
+
+def fetch_page(site_url):
+    '''Get a page through the cache, reporting the error instead of raising it.
+    
+    Parameters
+    ----------
+    site_url: string
+        The URL of the page
+    
+    Returns
+    -------
+    string or None
+        The HTML of the page, None if it could not be fetched
+    '''
+    try:
+        return make_request_with_cache(site_url)
+    except Exception as error:
+        print("Failed", site_url, error)
+        return None
+
+
+def parse_bass_info(response, site_url):
+    '''Parse a Guitar Center product page into the information of the bass.
+    Used by the processes of get_bass_infos, so it only returns plain data.
+    
+    Parameters
+    ----------
+    response: string
+        The HTML of the product page
+
+    site_url: string
+        The URL of the product page
+    
+    Returns
+    -------
+    list or None
+        The bass.info() list of the bass, None if the page is not a product page
+    '''
+    instance = parse_bass_page(response, site_url)
+    if instance is None:
+        return None
+    return instance.info()
+
+
+def get_bass_instance(site_url):
+    '''Make an instances from a Guitar Center product page.
+    
+    Parameters
+    ----------
+    site_url: string
+        The URL for a product page in Guitar Center
+    
+    Returns
+    -------
+    instance
+        a bass instance
+    '''
+    return parse_bass_page(make_request_with_cache(site_url), site_url)
+
+
+def parse_bass_page(response, site_url, targeted=True):
+    '''Make an instance from the HTML of a Guitar Center product page.
+    In targeted mode only the parts of the page holding the bass information are built
+    into a tree (see PRODUCT_STRAINER), which is much faster and smaller than the whole page.
+    
+    Parameters
+    ----------
+    response: string
+        The HTML of the product page
+
+    site_url: string
+        The URL of the product page
+
+    targeted: bool
+        Whether to build only the parts of the page that are read
+    
+    Returns
+    -------
+    instance or None
+        a bass instance, None if the page is not a product page
+    '''
+    if targeted:
+        soup = BeautifulSoup(response, HTML_PARSER, parse_only=PRODUCT_STRAINER)
+    else:
+        soup = BeautifulSoup(response, 'html.parser')
+    title = soup.find('div', class_='titleWrap')
+    if title is None:
+        pass
+    else:
+        product_name = title.text.lstrip()
+        brandname = title.find('span', class_='brand').text
+        brand_and_other = change_brandname_into_number(brandname)
+        brand = brand_and_other[0]
+        other_brand = brand_and_other[1]
+        picURL = soup.find('div', class_='product-left').find('img')['src']
+        try:
+            price = float(soup.find('span', class_='topAlignedPrice').text.strip().strip('$').replace(',', ''))
+        except:
+            price = None
+
+        try:
+            description = soup.find('section', id='product-overview').find('p', class_='description').text
+        except:
+            description = None
+        
+        styleslist = []
+        styles = ''
+        allstyles = soup.find('div', id='chooseStyleWrap').find_all('li')
+        for style in allstyles:
+            stylename = style.find('div', class_='styleLabel').text
+            styleslist.append(stylename)
+        styles = ', '.join(styleslist)
+        if len(styleslist) < 1:
+            stylename = title.find('span', class_='skuStyle').text
+            styles = stylename
+        
+        categories = soup.find_all('a', class_='category')
+        try:
+            category = categories[2].text
+        except:
+            category = categories[1].text
+
+        try:
+            uls = soup.find('div', class_='specs').find_all('ul')
+            featureslist = []
+            for ul in uls:
+                lis = ul.find_all('li')
+                for li in lis:
+                    featureslist.append(li.text.strip())
+            features = ' \n '.join(featureslist)
+        except:
+            features = None
+        return bass(product_name, brand, other_brand, category, price, styles, description, features, picURL, site_url)
+
+
+def parse_category(category):
+    '''Read the body type and the number of strings of a bass from its category,
+    like "Used 5 String Electric Bass" or "Fretted Acoustic Bass".
+    
+    Parameters
+    ----------
+    category: string or None
+        The category of the bass, or a filter typed like one
+    
+    Returns
+    -------
+    tuple
+        The body type (one of BODY_TYPES) and the number of strings, each None if the category does not say
+    '''
+    if not category:
+        return None, None
+    body_type = None
+    for name in BODY_TYPES:
+        if name.lower() in category.lower():
+            body_type = name
+            break
+    string_count = None
+    found = re.search(r'(\d+)\+? ?String', category, re.IGNORECASE)
+    if found is not None:
+        string_count = min(int(found.group(1)), MAX_STRING_COUNT)
+    return body_type, string_count
+
+
+def change_brandname_into_number(brandname):
+    '''Change the brand name into id. If several brands are found in the name,
+    the longest one is used, so "Paul Reed Smith" is not mistaken for "Smith".
+    
+    Parameters
+    ----------
+    brandname: string
+        The name of the brand
+    
+    Returns
+    -------
+    int or string
+        The id of the brand, return the original brandname if the id is not available
+    '''
+    brandcode = get_brand_matcher().best_match(brandname)
+    if brandcode is None:
+        return (0, brandname)
+    return (int(brandcode), None)
+
+
+def get_youtube_video_url(bassname):
+    '''Get the youtube video URL for the bass
+    
+    Parameters
+    ----------
+    bassname: string
+        The name of the bass
+    
+    Returns
+    -------
+    string or None
+        URL of the youtube page. return None if there is no result.
+    '''
+    query = youtube_search_url(bassname)
+    try:
+        response = make_request_with_cache(query)
+    except requests.RequestException as error:
+        print("Failed", query.split("?")[0], error)
+        return None
+    return parse_youtube_video_id(response)
+
+
+def youtube_search_url(bassname):
+    '''Build the YouTube API search URL for the bass
+    
+    Parameters
+    ----------
+    bassname: string
+        The name of the bass
+    
+    Returns
+    -------
+    string
+        The URL of the search
+    '''
+    base_url = "https://www.googleapis.com/youtube/v3/search?"
+    bassname = "%20".join(bassname.split(" "))
+    return str(base_url + "part=snippet&maxResults=1&q=" + bassname + "&key=" + API_KEY)
+
+
+def parse_youtube_video_id(response):
+    '''Get the id of the first video of a YouTube API search result
+    
+    Parameters
+    ----------
+    response: dict
+        The search result
+    
+    Returns
+    -------
+    string or None
+        The id of the video, None if there is no video
+    '''
+    try:
+        finalreturns = str(response['items'][0]['id']['videoId'])
+    except: finalreturns = None
+    return finalreturns
+
+
+def get_brands():
+    '''Get the name and the URL of all brands from Wikipedia "List of Guitar Manufacturers" page.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    dict
+        A dictionary having names of the brands as keys, and url of the Wikipedia page as values
+    '''
+    baseurl = "https://en.wikipedia.org"
+    url = "https://en.wikipedia.org/wiki/List_of_guitar_manufacturers"
+    response = make_request(url)[0]
+    soup = BeautifulSoup(response, 'html.parser')
+    brand_link = {}
+    results = soup.find('div', class_="div-col columns column-width").find_all('li')
+    for brand in results:
+        brand_name = brand.find('a').text
+        brandURL = brand.find('a')['href']
+        brand_link[brand_name] = baseurl + brandURL
+    return brand_link
 
 
 def get_brands_instance(brandname, site_url):
     '''Make an instances from a Wikipedia page.
     
-    Parameters
-    ----------
-    site_url: string
-        The URL for a product page in WikiPedia
+    Parameters
+    ----------
+    site_url: string
+        The URL for a product page in WikiPedia
+    
+    Returns
+    -------
+    instance
+        a brand instance
+    '''
+    response = make_request_with_cache(site_url)
+    soup = BeautifulSoup(response, 'html.parser')
+    try:
+        infobox = soup.find('table', class_='infobox vcard').find_all('tr')
+        info_dict = {}
+        website = ""
+        country = ""
+        for info in infobox:
+            try:
+                info_dict[info.find('th').text.lower()] = info.find('td')
+            except:
+                pass
+        if 'headquarters' in info_dict.keys():
+            country = info_dict['headquarters'].find('div', class_='country-name').text
+            if country is not None:
+                country = country.strip(',').strip('.').strip()
+        elif 'country' in info_dict.keys():
+            country = info_dict['country'].text
+            if country is not None:
+                country = country.strip(',').strip('.').strip()
+        if 'website' in info_dict.keys():
+            website = info_dict['website'].a['href']
+        else:
+            website = site_url
+    except:
+        website = site_url
+        country = None
+
+    row_description = soup.find('div', id='mw-content-text').find('div', class_='mw-parser-output').find_all('p')
+    if 'coordinates' in str(row_description[0]):
+        description = row_description[1].text
+    else:
+        description = row_description[0].text
+    
+    return brand(brandname, country, description, website)
+
+
+# Functions in this part work with the database
+class connection_pool():
+    '''A pool of connections to the SQLite database, shared by the threads of one process.
+    Every process using the database file gets its own pool. In WAL mode the processes can
+    read at the same time, and a writer waits up to busy_timeout for the others.
+
+    Instance Attributes
+    -------------------
+    filename: string
+        The path of the database file
+
+    size: int
+        The number of idle connections kept open
+
+    journal_mode: string
+        The SQLite journal mode set on every connection
+
+    busy_timeout: float
+        The seconds a connection waits for a lock held by another connection
+
+    statement_cache: int
+        The number of prepared statements each connection keeps for reuse
+    '''
+
+    def __init__(self, filename, size=DB_POOL_SIZE, journal_mode=DB_JOURNAL_MODE, busy_timeout=DB_BUSY_TIMEOUT, statement_cache=DB_STATEMENT_CACHE):
+        self.filename = filename
+        self.size = size
+        self.journal_mode = journal_mode
+        self.busy_timeout = busy_timeout
+        self.statement_cache = statement_cache
+        self.idle = queue.LifoQueue()
+        self.pid = os.getpid()
+
+    def connect(self):
+        '''Open a new connection to the database
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        A sqlite3 connection
+        '''
+        conn = sqlite3.connect(self.filename, timeout=self.busy_timeout, check_same_thread=False, cached_statements=self.statement_cache)
+        conn.execute('PRAGMA journal_mode = ' + self.journal_mode)
+        if self.journal_mode.upper() == "WAL":
+            conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def borrow(self):
+        '''Take an idle connection from the pool, or open a new one if there is none.
+        Connections inherited from a parent process are dropped rather than reused.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        A sqlite3 connection
+        '''
+        if self.pid != os.getpid():
+            self.idle = queue.LifoQueue()
+            self.pid = os.getpid()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def give_back(self, conn):
+        '''Put a borrowed connection back to the pool, or close it if the pool is full
+
+        Parameters
+        ----------
+        conn: sqlite3 connection
+            A connection returned by borrow
+
+        Returns
+        ----------
+        None
+        '''
+        if conn.in_transaction:
+            conn.rollback()
+        if self.pid != os.getpid() or self.idle.qsize() >= self.size:
+            conn.close()
+        else:
+            self.idle.put(conn)
+
+    def close(self):
+        '''Close all the idle connections
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+        '''
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+DB_POOL = connection_pool(DB_FILENAME)
+THREAD_DB = threading.local()
+
+
+def configure_db(filename=DB_FILENAME, pool_size=DB_POOL_SIZE, journal_mode=DB_JOURNAL_MODE, busy_timeout=DB_BUSY_TIMEOUT, statement_cache=DB_STATEMENT_CACHE):
+    '''Change the database file or the settings of the connections to it.
+    Call it before the first request, or in each worker process after forking.
+
+    Parameters
+    ----------
+    filename: string
+        The path of the database file
+
+    pool_size: int
+        The number of idle connections kept open
+
+    journal_mode: string
+        The SQLite journal mode, "WAL" lets several processes read while one writes
+
+    busy_timeout: float
+        The seconds a connection waits for a lock held by another connection
+
+    statement_cache: int
+        The number of prepared statements each connection keeps for reuse
+
+    Returns
+    ----------
+    None
+    '''
+    global DB_POOL, THREAD_DB, FTS_ENABLED, CHART_CACHE, CATALOG, NAME_INDEX
+    DB_POOL.close()
+    DB_POOL = connection_pool(filename, pool_size, journal_mode, busy_timeout, statement_cache)
+    THREAD_DB = threading.local()
+    FTS_ENABLED = None
+    CHART_CACHE = None
+    CATALOG = None
+    NAME_INDEX = None
+    SEARCH_CACHE.clear()
+
+
+def get_db():
+    '''Get the database connection for the caller. A Flask request borrows one connection
+    from the pool and gives it back when the request ends. Other threads, like the scrapping,
+    keep their own connection.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    A sqlite3 connection
+    '''
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = DB_POOL.borrow()
+        return g.db_conn
+    if getattr(THREAD_DB, 'pid', None) != os.getpid():
+        THREAD_DB.conn = DB_POOL.connect()
+        THREAD_DB.pid = os.getpid()
+    return THREAD_DB.conn
+
+
+@app.before_request
+def prepare_db_once():
+    '''Prepare the database before the first request of the process, whatever runs the app
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    None
+    '''
+    ensure_db()
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    '''Give the connection borrowed by the request back to the pool
+
+    Parameters
+    ----------
+    exception: Exception or None
+        The exception raised by the request, if any
+
+    Returns
+    ----------
+    None
+    '''
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        DB_POOL.give_back(conn)
+
+
+def create_db():
+    '''Create the databases for basses and brands
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    None
+    '''
+    global BRAND_MATCHER
+    conn = get_db()
+    cur = conn.cursor()
+    drop_basses = 'DROP TABLE IF EXISTS "Basses"'
+    drop_brands = 'DROP TABLE IF EXISTS "Brands"'
+    drop_search = 'DROP TABLE IF EXISTS "BassSearch"'
+    drop_videos = 'DROP TABLE IF EXISTS "Videos"'
+    cur.execute(drop_basses)
+    cur.execute(drop_brands)
+    cur.execute(drop_search)
+    cur.execute(drop_videos)
+    conn.commit()
+    BRAND_MATCHER = None
+    prepare_db()
+    with conn:
+        bump_catalog_generation(conn)
+
+
+def prepare_db():
+    '''Create the tables of the basses and the brands, and add the columns used by the
+    incremental refresh and by the facets, the indexes used to sort and filter the basses,
+    the tables of the video lookups, of the catalog generation and of the country names, and the
+    full-text search index to the database if they are missing.
+    The index is a FTS5 table kept in sync with the Basses table by triggers, and it is
+    filled from the existing rows the first time it is created.
+    If SQLite is built without FTS5, the keyword search falls back to LIKE.
+    It is run by the jobs writing the catalog, and once per process by ensure_db before the
+    first search. Everything is done in one BEGIN IMMEDIATE transaction, so two processes
+    preparing the same database do not add the same column twice.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    None
+    '''
+    global FTS_ENABLED
+    conn = get_db()
+    cur = conn.cursor()
+    create_basses = '''
+        CREATE TABLE IF NOT EXISTS "Basses" (
+            'BassId' INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+            'ModelName' TEXT NOT NULL,
+            'Brand' INTEGER NOT NULL,
+            'OtherBrand' TEXT,
+            'Category' INTEGER NOT NULL,
+            'Price' DECIMAL,
+            'Styles' TEXT NOT NULL,
+            'Description' TEXT,
+            'Features' TEXT,
+            'PicURL' TEXT NOT NULL,
+            'URL' TEXT NOT NULL,
+            'ContentHash' TEXT,
+            'Active' INTEGER NOT NULL DEFAULT 1,
+            'LastSeen' REAL,
+            'BodyType' TEXT,
+            'StringCount' INTEGER
+        )
+    '''
+
+    create_brands = '''
+        CREATE TABLE IF NOT EXISTS "Brands" (
+            "BrandId" INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+            "BrandName" TEXT NOT NULL,
+            "BrandCountry" TEXT,
+            "BrandDescription" TEXT,
+            "URL" TEXT NOT NULL
+        );
+    '''
+    add_refresh_columns = '''
+        ALTER TABLE Basses ADD COLUMN "ContentHash" TEXT;
+        ALTER TABLE Basses ADD COLUMN "Active" INTEGER NOT NULL DEFAULT 1;
+        ALTER TABLE Basses ADD COLUMN "LastSeen" REAL;
+    '''
+    add_facet_columns = '''
+        ALTER TABLE Basses ADD COLUMN "BodyType" TEXT;
+        ALTER TABLE Basses ADD COLUMN "StringCount" INTEGER;
+    '''
+    create_indexes = '''
+        CREATE INDEX IF NOT EXISTS "Basses_Price" ON Basses (Price);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType_StringCount_Price" ON Basses (BodyType, StringCount, Price);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType_Price" ON Basses (BodyType, Price);
+        CREATE INDEX IF NOT EXISTS "Basses_StringCount_Price" ON Basses (StringCount, Price);
+        CREATE INDEX IF NOT EXISTS "Basses_ModelName" ON Basses (ModelName);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType_StringCount_ModelName" ON Basses (BodyType, StringCount, ModelName);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType_ModelName" ON Basses (BodyType, ModelName);
+        CREATE INDEX IF NOT EXISTS "Basses_StringCount_ModelName" ON Basses (StringCount, ModelName);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType_StringCount" ON Basses (BodyType, StringCount);
+        CREATE INDEX IF NOT EXISTS "Basses_BodyType" ON Basses (BodyType);
+        CREATE INDEX IF NOT EXISTS "Basses_StringCount" ON Basses (StringCount);
+        CREATE UNIQUE INDEX IF NOT EXISTS "Basses_URL" ON Basses (URL);
+    '''
+    create_videos = '''
+        CREATE TABLE IF NOT EXISTS "Videos" (
+            "BassId" INTEGER PRIMARY KEY,
+            "VideoId" TEXT,
+            "ResolvedAt" REAL NOT NULL,
+            "Failures" INTEGER NOT NULL DEFAULT 0,
+            "RetryAt" REAL
+        );
+        CREATE TABLE IF NOT EXISTS "YouTubeQuota" (
+            "Day" TEXT PRIMARY KEY,
+            "Used" INTEGER NOT NULL
+        );
+    '''
+    create_meta = '''
+        CREATE TABLE IF NOT EXISTS "CatalogMeta" (
+            "Name" TEXT PRIMARY KEY,
+            "Value" INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS "Charts" (
+            "Name" TEXT PRIMARY KEY,
+            "Generation" INTEGER NOT NULL,
+            "JSON" TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS "CountryNames" (
+            "Country" TEXT PRIMARY KEY,
+            "Normalized" TEXT NOT NULL
+        );
+    '''
+    create_search = '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS "BassSearch" USING fts5(
+            ModelName,
+            BrandName,
+            Styles,
+            Description,
+            Features,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    '''
+    fill_search = '''
+        INSERT INTO BassSearch (rowid, ModelName, BrandName, Styles, Description, Features)
+        SELECT BassId, ModelName, IFNULL(Brands.BrandName, OtherBrand), Styles, Description, Features
+        FROM Basses
+        LEFT OUTER JOIN Brands
+            ON Basses.Brand = Brands.BrandId
+    '''
+    create_triggers = '''
+        CREATE TRIGGER IF NOT EXISTS "Basses_ai" AFTER INSERT ON Basses BEGIN
+            INSERT INTO BassSearch (rowid, ModelName, BrandName, Styles, Description, Features)
+            VALUES (new.BassId, new.ModelName, IFNULL((SELECT BrandName FROM Brands WHERE BrandId = new.Brand), new.OtherBrand), new.Styles, new.Description, new.Features);
+        END;
+        CREATE TRIGGER IF NOT EXISTS "Basses_ad" AFTER DELETE ON Basses BEGIN
+            DELETE FROM BassSearch WHERE rowid = old.BassId;
+        END;
+        DROP TRIGGER IF EXISTS "Basses_au";
+        CREATE TRIGGER "Basses_au" AFTER UPDATE OF ModelName, Brand, OtherBrand, Styles, Description, Features ON Basses BEGIN
+            DELETE FROM BassSearch WHERE rowid = old.BassId;
+            INSERT INTO BassSearch (rowid, ModelName, BrandName, Styles, Description, Features)
+            VALUES (new.BassId, new.ModelName, IFNULL((SELECT BrandName FROM Brands WHERE BrandId = new.Brand), new.OtherBrand), new.Styles, new.Description, new.Features);
+        END;
+        CREATE TRIGGER IF NOT EXISTS "Brands_au" AFTER UPDATE OF BrandName ON Brands BEGIN
+            UPDATE BassSearch SET BrandName = new.BrandName
+            WHERE rowid IN (SELECT BassId FROM Basses WHERE Brand = new.BrandId);
+        END;
+    '''
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        cur.execute(create_basses)
+        execute_statements(cur, create_brands)
+        columns = [column[1] for column in cur.execute('PRAGMA table_info(Basses)')]
+        if 'ContentHash' not in columns:
+            execute_statements(cur, add_refresh_columns)
+        if 'BodyType' not in columns:
+            execute_statements(cur, add_facet_columns)
+            categories = cur.execute('SELECT BassId, Category FROM Basses').fetchall()
+            cur.executemany('UPDATE Basses SET BodyType = ?, StringCount = ? WHERE BassId = ?',
+                [parse_category(category) + (bassid,) for bassid, category in categories])
+        execute_statements(cur, create_videos)
+        if 'RetryAt' not in [column[1] for column in cur.execute('PRAGMA table_info(Videos)')]:
+            execute_statements(cur, '''
+                ALTER TABLE Videos ADD COLUMN "Failures" INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE Videos ADD COLUMN "RetryAt" REAL;
+            ''')
+        execute_statements(cur, create_meta)
+        if cur.execute("SELECT name FROM sqlite_master WHERE name = 'Basses_URL'").fetchone() is None:
+            merge_duplicate_urls(cur)
+        indexes = cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0]
+        execute_statements(cur, create_indexes)
+        if cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0] != indexes:
+            analyze_basses(cur.connection)
+        cur.executemany('INSERT OR REPLACE INTO CountryNames (Country, Normalized) VALUES (?, ?)', COUNTRY_NAMES.items())
+        existing = cur.execute("SELECT name FROM sqlite_master WHERE name = 'BassSearch'").fetchone()
+        try:
+            cur.execute(create_search)
+            fts_enabled = True
+        except sqlite3.OperationalError:
+            fts_enabled = False
+        if fts_enabled:
+            if existing is None:
+                cur.execute(fill_search)
+            execute_statements(cur, create_triggers)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    FTS_ENABLED = fts_enabled
+
+
+def analyze_basses(conn):
+    '''Count the basses of each value of the indexes, so SQLite reads a page of the results
+    sorted by the index of its sort order instead of sorting all the basses found.
+    Call it when the indexes or many basses changed.
+    
+    Parameters
+    ----------
+    conn: Connection
+        The connection writing the change
+    
+    Returns
+    -------
+    None
+    '''
+    conn.execute('ANALYZE Basses')
+
+
+def merge_duplicate_urls(cur):
+    '''Keep only the last saved bass of each URL, so the URL can be given a unique index.
+    The other basses and their videos are deleted, and their number is reported.
+    
+    Parameters
+    ----------
+    cur: sqlite3 cursor
+        The cursor of the transaction preparing the database
+    
+    Returns
+    -------
+    int
+        The number of basses deleted
+    '''
+    duplicates = cur.execute('''
+        SELECT BassId FROM Basses
+        WHERE BassId NOT IN (SELECT MAX(BassId) FROM Basses GROUP BY URL)
+    ''').fetchall()
+    if len(duplicates) > 0:
+        cur.executemany('DELETE FROM Basses WHERE BassId = ?', duplicates)
+        cur.executemany('DELETE FROM Videos WHERE BassId = ?', duplicates)
+        bump_catalog_generation(cur.connection)
+        print("Merged", len(duplicates), "basses saved twice with the same URL")
+    return len(duplicates)
+
+
+def execute_statements(cur, script):
+    '''Run the SQL statements of a script one by one. Unlike executescript, it does not
+    commit the transaction in progress first.
+    
+    Parameters
+    ----------
+    cur: sqlite3 cursor
+        The cursor running the statements
+
+    script: string
+        The statements, separated by semicolons
+    
+    Returns
+    -------
+    None
+    '''
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            cur.execute(statement)
+            statement = ''
+
+
+def ensure_db():
+    '''Prepare the database the first time the process uses it, see prepare_db.
+    The threads serving the first requests wait for the one preparing it.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    bool
+        Whether the keyword search uses the FTS5 index
+    '''
+    with DB_PREPARE_LOCK:
+        if FTS_ENABLED is None:
+            prepare_db()
+        return FTS_ENABLED
+
+
+def save_to_basses(bass):
+    '''Save the bass to database.
+    
+    Parameters
+    ----------
+    bass: instance
+        A bass instance contains all the data to be stored
+    
+    Returns
+    -------
+    None
+    '''
+    conn = get_db()
+    insert_basses = '''
+    INSERT INTO Basses (ModelName, Brand, OtherBrand, Category, Price, Styles, Description, Features, PicURL, URL, BodyType, StringCount)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    with conn:
+        conn.execute(insert_basses, bass)
+        bump_catalog_generation(conn)
+
+
+def save_to_brands(brand):
+    '''Save the brand to database.
+    
+    Parameters
+    ----------
+    brand: instance
+        A brand instance contains all the data to be stored
+    
+    Returns
+    -------
+    None
+    '''
+    conn = get_db()
+    insert_brands = '''
+    INSERT INTO Brands (BrandName, BrandCountry, BrandDescription, URL)
+    VALUES (?, ?, ?, ?)
+    '''
+    global BRAND_MATCHER
+    with conn:
+        conn.execute(insert_brands, brand)
+        bump_catalog_generation(conn)
+    BRAND_MATCHER = None
+
+def save_many_to_basses(basses, chunk_size=BULK_CHUNK_SIZE):
+    '''Save many basses to database, chunk_size rows per transaction.
+    A bass whose URL is already saved is skipped, instead of failing its whole chunk.
+    
+    Parameters
+    ----------
+    basses: iterable
+        The bass.info() lists of the basses to be stored
+
+    chunk_size: int or None
+        The number of rows inserted per transaction, None saves everything in one transaction
+    
+    Returns
+    -------
+    tuple
+        The number of rows saved and the rows saved per second
+    '''
+    insert_basses = '''
+    INSERT OR IGNORE INTO Basses (ModelName, Brand, OtherBrand, Category, Price, Styles, Description, Features, PicURL, URL, BodyType, StringCount)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    saved = bulk_insert(insert_basses, basses, chunk_size, "basses")
+    conn = get_db()
+    with conn:
+        analyze_basses(conn)
+    return saved
+
+
+def save_many_to_brands(brands, chunk_size=BULK_CHUNK_SIZE):
+    '''Save many brands to database, chunk_size rows per transaction.
+    
+    Parameters
+    ----------
+    brands: iterable
+        The brand.info() lists of the brands to be stored
+
+    chunk_size: int or None
+        The number of rows inserted per transaction, None saves everything in one transaction
+    
+    Returns
+    -------
+    tuple
+        The number of rows saved and the rows saved per second
+    '''
+    global BRAND_MATCHER
+    insert_brands = '''
+    INSERT INTO Brands (BrandName, BrandCountry, BrandDescription, URL)
+    VALUES (?, ?, ?, ?)
+    '''
+    saved = bulk_insert(insert_brands, brands, chunk_size, "brands")
+    BRAND_MATCHER = None
+    return saved
+
+
+def bulk_insert(query, rows, chunk_size, name):
+    '''Insert rows with executemany, committing once per chunk, and report the speed.
+    
+    Parameters
+    ----------
+    query: string
+        The INSERT statement
+
+    rows: iterable
+        The rows to insert, it can be a generator
+
+    chunk_size: int or None
+        The number of rows inserted per transaction, None inserts everything in one transaction
+
+    name: string
+        What the rows are, for the report
+    
+    Returns
+    -------
+    tuple
+        The number of rows inserted, not counting the ones ignored by the statement,
+        and the rows inserted per second
+    '''
+    conn = get_db()
+    rows = iter(rows)
+    count = 0
+    start = time.perf_counter()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size)) if chunk_size else list(rows)
+        if len(chunk) < 1:
+            break
+        with conn:
+            count += conn.executemany(query, chunk).rowcount
+            bump_catalog_generation(conn)
+        if not chunk_size:
+            break
+    seconds = time.perf_counter() - start
+    speed = count / seconds if seconds > 0 else 0
+    print("Saved", count, name, "in", round(seconds, 2), "seconds,", round(speed), "rows/second")
+    return count, speed
+
+
+def bump_catalog_generation(conn):
+    '''Count one more change of the basses or the brands, so what was computed from the
+    catalog before is built again. Call it in the transaction that changes the catalog.
+    
+    Parameters
+    ----------
+    conn: Connection
+        The connection writing the change
+    
+    Returns
+    -------
+    None
+    '''
+    conn.execute('''
+        INSERT INTO CatalogMeta (Name, Value) VALUES ('Generation', 1)
+        ON CONFLICT (Name) DO UPDATE SET Value = Value + 1
+    ''')
+
+
+def catalog_generation():
+    '''Get the number of changes of the catalog so far
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    int
+        The catalog generation, 0 if the catalog never changed
+    '''
+    ensure_db()
+    row = get_db().execute("SELECT Value FROM CatalogMeta WHERE Name = 'Generation'").fetchone()
+    return row[0] if row is not None else 0
+
+def refresh_basses(site_urls, max_workers=CRAWL_WORKERS, parse_workers=PARSE_WORKERS):
+    '''Update the basses from the product pages instead of recreating the table.
+    Pages whose content did not change since the last refresh are not parsed again,
+    changed and new pages are saved by their URL, and basses no longer listed are marked
+    inactive. Everything is written in one transaction, so the site keeps showing the
+    old catalog until the new one is complete.
+    
+    Parameters
+    ----------
+    site_urls: list
+        The URLs of all the product pages listed in the online shop
+
+    max_workers: int
+        The number of product pages fetched at the same time
+
+    parse_workers: int
+        The number of processes parsing the pages
+    
+    Returns
+    -------
+    dict
+        The number of basses "changed", "unchanged", "failed" and "deactivated"
+    '''
+    prepare_db()
+    conn = get_db()
+    site_urls = list(dict.fromkeys(site_urls))
+    if len(site_urls) < 1:
+        return {'changed': 0, 'unchanged': 0, 'failed': 0, 'deactivated': 0}
+    known_hashes = dict(conn.execute('SELECT URL, ContentHash FROM Basses'))
+    report = {'changed': 0, 'unchanged': 0, 'failed': 0}
+    parsing = []
+    with ThreadPoolExecutor(max_workers=max_workers) as fetchers, parser_pool(parse_workers) as parsers:
+        for site_url, response in zip(site_urls, fetchers.map(fetch_page, site_urls)):
+            if response is None:
+                report['failed'] += 1
+                continue
+            content_hash = hashlib.sha1(response.encode('utf-8')).hexdigest()
+            if known_hashes.get(site_url) == content_hash:
+                report['unchanged'] += 1
+                continue
+            parsing.append((site_url, content_hash, parsers.submit(parse_bass_info, response, site_url)))
+        changed = []
+        for site_url, content_hash, future in parsing:
+            try:
+                info = future.result()
+            except Exception as error:
+                print("Failed", site_url, error)
+                info = None
+            if info is None:
+                report['failed'] += 1
+                continue
+            changed.append(list(info) + [content_hash])
+    report['changed'] = len(changed)
+    report['deactivated'] = save_refresh(changed, site_urls)
+    get_cache().flush()
+    print("Refreshed basses:", report)
+    return report
+
+
+def save_refresh(changed, site_urls, deactivate=True):
+    '''Write the result of a refresh in one transaction.
+    
+    Parameters
+    ----------
+    changed: list
+        The bass.info() lists of the new and changed basses, each followed by the hash of its page
+
+    site_urls: list
+        The URLs of all the product pages listed in the online shop
+
+    deactivate: bool
+        Whether to mark the basses not in site_urls inactive, False if the list may be incomplete
+    
+    Returns
+    -------
+    int
+        The number of basses marked inactive
+    '''
+    upsert_basses = '''
+    INSERT INTO Basses (ModelName, Brand, OtherBrand, Category, Price, Styles, Description, Features, PicURL, URL, BodyType, StringCount, ContentHash, Active, LastSeen)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT (URL) DO UPDATE SET
+        ModelName = excluded.ModelName,
+        Brand = excluded.Brand,
+        OtherBrand = excluded.OtherBrand,
+        Category = excluded.Category,
+        Price = excluded.Price,
+        Styles = excluded.Styles,
+        Description = excluded.Description,
+        Features = excluded.Features,
+        PicURL = excluded.PicURL,
+        BodyType = excluded.BodyType,
+        StringCount = excluded.StringCount,
+        ContentHash = excluded.ContentHash,
+        Active = 1,
+        LastSeen = excluded.LastSeen
+    '''
+    conn = get_db()
+    now = time.time()
+    with conn:
+        conn.executemany(upsert_basses, [row + [now] for row in changed])
+        conn.executemany('UPDATE Basses SET Active = 1, LastSeen = ? WHERE URL = ?', [(now, site_url) for site_url in site_urls])
+        deactivated = 0
+        if deactivate:
+            deactivated = conn.execute('UPDATE Basses SET Active = 0 WHERE Active = 1 AND (LastSeen IS NULL OR LastSeen < ?)', (now,)).rowcount
+        bump_catalog_generation(conn)
+        analyze_basses(conn)
+    return deactivated
+
+
+def refresh_brands(brands):
+    '''Update the brands by their names instead of recreating the table, so the ids
+    the basses refer to stay the same. Written in one transaction.
+    
+    Parameters
+    ----------
+    brands: iterable
+        The brand.info() lists of the brands
+    
+    Returns
+    -------
+    int
+        The number of brands saved
+    '''
+    global BRAND_MATCHER
+    conn = get_db()
+    count = 0
+    with conn:
+        for brand_info in brands:
+            updated = conn.execute('''
+                UPDATE Brands SET BrandCountry = ?, BrandDescription = ?, URL = ?
+                WHERE BrandName = ?
+            ''', (brand_info[1], brand_info[2], brand_info[3], brand_info[0])).rowcount
+            if updated == 0:
+                conn.execute('''
+                    INSERT INTO Brands (BrandName, BrandCountry, BrandDescription, URL)
+                    VALUES (?, ?, ?, ?)
+                ''', brand_info)
+            count += 1
+        bump_catalog_generation(conn)
+    BRAND_MATCHER = None
+    return count
+
+class crawl_job():
+    '''The state of a crawl of the online shop, saved in a SQLite file after every page,
+    so a crawl that stops can continue where it was.
+    Every URL of the frontier is "pending", "fetched", "parsed" or "failed". A page that fails
+    goes back to pending and is retried later, waiting twice as long after each failure,
+    until it has failed max_attempts times.
+
+    Instance Attributes
+    -------------------
+    filename: string
+        The path of the file saving the state
+
+    max_attempts: int
+        The number of times a page is tried before it is given up
+
+    retry_delay: float
+        The seconds before the first retry of a page
+    '''
+
+    def __init__(self, filename=CRAWL_FILENAME, max_attempts=CRAWL_MAX_ATTEMPTS, retry_delay=CRAWL_RETRY_DELAY):
+        self.filename = filename
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS "Frontier" (
+                "URL" TEXT PRIMARY KEY,
+                "Kind" TEXT NOT NULL,
+                "Status" TEXT NOT NULL,
+                "Attempts" INTEGER NOT NULL DEFAULT 0,
+                "NextAttempt" REAL NOT NULL DEFAULT 0,
+                "LastError" TEXT,
+                "ContentHash" TEXT,
+                "Info" TEXT,
+                "UpdatedAt" REAL
+            )
+        ''')
+        self.conn.commit()
+
+    def execute(self, query, params=()):
+        '''Run a statement on the state file and save it right away
+
+        Parameters
+        ----------
+        query: string
+            The SQL statement
+
+        params: tuple
+            The parameters of the statement
+
+        Returns
+        ----------
+        list
+            The rows returned by the statement
+        '''
+        with self.lock:
+            with self.conn:
+                return self.conn.execute(query, params).fetchall()
+
+    def add(self, urls, kind):
+        '''Add URLs to the frontier, the ones already in it are left as they are
+
+        Parameters
+        ----------
+        urls: list
+            The URLs to add
+
+        kind: string
+            "listing" or "product"
+
+        Returns
+        ----------
+        None
+        '''
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('''
+                    INSERT OR IGNORE INTO Frontier (URL, Kind, Status, UpdatedAt)
+                    VALUES (?, ?, 'pending', ?)
+                ''', [(url, kind, time.time()) for url in urls])
+
+    def ready(self, kind, limit=None):
+        '''Get the URLs waiting to be fetched now, or fetched but not parsed yet
+
+        Parameters
+        ----------
+        kind: string
+            "listing" or "product"
+
+        limit: int or None
+            The maximum number of URLs to return
+
+        Returns
+        ----------
+        list
+            The URLs
+        '''
+        rows = self.execute('''
+            SELECT URL FROM Frontier
+            WHERE Kind = ? AND (Status = 'fetched' OR (Status = 'pending' AND NextAttempt <= ?))
+            ORDER BY rowid LIMIT ?
+        ''', (kind, time.time(), limit if limit else -1))
+        return [row[0] for row in rows]
+
+    def next_retry(self):
+        '''Get the seconds until the next page waiting for a retry can be tried
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        float or None
+            The seconds to wait, None if no page is waiting
+        '''
+        row = self.execute("SELECT MIN(NextAttempt) FROM Frontier WHERE Status = 'pending'")[0]
+        if row[0] is None:
+            return None
+        return max(0, row[0] - time.time())
+
+    def mark_fetched(self, url, content_hash):
+        self.execute('''
+            UPDATE Frontier SET Status = 'fetched', ContentHash = ?, UpdatedAt = ? WHERE URL = ?
+        ''', (content_hash, time.time(), url))
+
+    def mark_parsed(self, url, info=None):
+        self.execute('''
+            UPDATE Frontier SET Status = 'parsed', Info = ?, LastError = NULL, UpdatedAt = ? WHERE URL = ?
+        ''', (json.dumps(info) if info is not None else None, time.time(), url))
+
+    def mark_failed(self, url, error):
+        '''Record a failure of a page, and schedule its retry or give it up
+
+        Parameters
+        ----------
+        url: string
+            The URL of the page
+
+        error: Exception or string
+            What went wrong
+
+        Returns
+        ----------
+        None
+        '''
+        print("Failed", url, error)
+        attempts = self.execute('SELECT Attempts FROM Frontier WHERE URL = ?', (url,))[0][0] + 1
+        status = 'failed' if attempts >= self.max_attempts else 'pending'
+        next_attempt = time.time() + self.retry_delay * 2 ** (attempts - 1)
+        self.execute('''
+            UPDATE Frontier SET Status = ?, Attempts = ?, NextAttempt = ?, LastError = ?, UpdatedAt = ? WHERE URL = ?
+        ''', (status, attempts, next_attempt, str(error), time.time(), url))
+        try:
+            del get_cache()[url]
+        except KeyError:
+            pass
+
+    def counts(self):
+        '''Count the URLs of the frontier by status
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        dict
+            The number of URLs, with the statuses as keys
+        '''
+        return dict(self.execute('SELECT Status, COUNT(*) FROM Frontier GROUP BY Status'))
+
+    def clear(self):
+        '''Forget the crawl, so the next one starts from the beginning
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+        '''
+        self.execute('DELETE FROM Frontier')
+
+
+def run_crawl(job=None, base_url=GC_BASE_URL, max_workers=CRAWL_WORKERS, parse_workers=PARSE_WORKERS, batch_size=200):
+    '''Crawl the online shop and refresh the basses, resuming the last crawl if it did not finish.
+    Listing pages are crawled first, then the product pages they list. Product pages that did
+    not change since the last refresh are not parsed again. When no page is left to try, the
+    basses are saved like refresh_basses does and the crawl is cleared.
+    
+    Parameters
+    ----------
+    job: crawl_job or None
+        The state of the crawl, None opens CRAWL_FILENAME
+
+    base_url: string
+        The address of the online shop, it can point to a local copy of it
+
+    max_workers: int
+        The number of pages fetched at the same time
+
+    parse_workers: int
+        The number of processes parsing the product pages
+
+    batch_size: int
+        The number of pages handled between two looks at the frontier
+    
+    Returns
+    -------
+    dict
+        The number of URLs by status when the crawl finished, plus the number of basses "deactivated"
+    '''
+    prepare_db()
+    if job is None:
+        job = crawl_job()
+    if len(job.counts()) == 0:
+        job.add(get_listing_urls(base_url), 'listing')
+    known_hashes = dict(get_db().execute('SELECT URL, ContentHash FROM Basses'))
+
+    def fetch_for_job(site_url):
+        try:
+            response = make_request_with_cache(site_url)
+        except Exception as error:
+            job.mark_failed(site_url, error)
+            return None
+        job.mark_fetched(site_url, hashlib.sha1(response.encode('utf-8')).hexdigest())
+        return response
+
+    with ThreadPoolExecutor(max_workers=max_workers) as fetchers, parser_pool(parse_workers) as parsers:
+        while True:
+            listing_urls = job.ready('listing', batch_size)
+            for site_url, response in zip(listing_urls, fetchers.map(fetch_for_job, listing_urls)):
+                if response is None:
+                    continue
+                try:
+                    job.add(list(parse_listing_page(response, base_url).values()), 'product')
+                except Exception as error:
+                    job.mark_failed(site_url, error)
+                    continue
+                job.mark_parsed(site_url)
+
+            product_urls = job.ready('product', batch_size)
+            parsing = []
+            for site_url, response in zip(product_urls, fetchers.map(fetch_for_job, product_urls)):
+                if response is None:
+                    continue
+                content_hash = hashlib.sha1(response.encode('utf-8')).hexdigest()
+                if known_hashes.get(site_url) == content_hash:
+                    job.mark_parsed(site_url)
+                    continue
+                parsing.append((site_url, parsers.submit(parse_bass_info, response, site_url)))
+            for site_url, future in parsing:
+                try:
+                    info = future.result()
+                except Exception as error:
+                    job.mark_failed(site_url, error)
+                    continue
+                if info is None:
+                    job.mark_failed(site_url, "not a product page")
+                else:
+                    job.mark_parsed(site_url, info)
+
+            if len(listing_urls) + len(product_urls) > 0:
+                continue
+            wait = job.next_retry()
+            if wait is None:
+                break
+            print("Waiting", round(wait), "seconds to retry the failed pages")
+            time.sleep(wait)
+
+    report = job.counts()
+    rows = job.execute("SELECT Info, ContentHash FROM Frontier WHERE Kind = 'product' AND Status = 'parsed' AND Info IS NOT NULL")
+    changed = [bass(*json.loads(row[0])[:10]).info() + [row[1]] for row in rows]
+    site_urls = [row[0] for row in job.execute("SELECT URL FROM Frontier WHERE Kind = 'product'")]
+    listing_failed = job.execute("SELECT COUNT(*) FROM Frontier WHERE Kind = 'listing' AND Status = 'failed'")[0][0]
+    report['deactivated'] = save_refresh(changed, site_urls, listing_failed == 0) if len(site_urls) > 0 else 0
+    job.clear()
+    get_cache().flush()
+    print("Crawl finished:", report)
+    return report
+
+def spend_youtube_quota(units, daily_quota=YOUTUBE_DAILY_QUOTA):
+    '''Take units from the YouTube API quota of the day, if enough are left.
+    The use is counted in the database, so the pre-warm job and the site share the quota.
+    The quota starts again at midnight Pacific Time, like the one of the YouTube API.
+    
+    Parameters
+    ----------
+    units: int
+        The quota units the request costs
+
+    daily_quota: int
+        The quota units available per day
+    
+    Returns
+    -------
+    bool
+        True if the units were taken, False if the quota of the day is used up
+    '''
+    day = youtube_quota_day()
+    conn = get_db()
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO YouTubeQuota (Day, Used) VALUES (?, 0)', (day,))
+        taken = conn.execute('UPDATE YouTubeQuota SET Used = Used + ? WHERE Day = ? AND Used + ? <= ?', (units, day, units, daily_quota)).rowcount
+    return taken == 1
+
+
+def refund_youtube_quota(units):
+    '''Give back units taken by spend_youtube_quota for a request that did not reach the API
+    
+    Parameters
+    ----------
+    units: int
+        The quota units to give back
+    
+    Returns
+    -------
+    None
+    '''
+    conn = get_db()
+    with conn:
+        conn.execute('UPDATE YouTubeQuota SET Used = MAX(Used - ?, 0) WHERE Day = ?', (units, youtube_quota_day()))
+
+
+def youtube_quota_day():
+    '''Get the day the YouTube API quota is counted for, which starts at midnight Pacific Time,
+    daylight saving time included
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    string
+        The day, like "2020-04-21"
+    '''
+    return datetime.datetime.now(YOUTUBE_QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+
+def stored_video(bassid):
+    '''Get the video found for the bass by an earlier lookup
+    
+    Parameters
+    ----------
+    bassid: int
+        The id of the bass
+    
+    Returns
+    -------
+    tuple
+        Whether the bass was looked up, the video id or None if no video was found, and
+        whether it should be looked up again: the lookup is older than VIDEO_TTL, or it
+        failed and the time to retry it has come
+    '''
+    row = get_db().execute('SELECT VideoId, ResolvedAt, RetryAt FROM Videos WHERE BassId = ?', (bassid,)).fetchone()
+    if row is None:
+        return False, None, True
+    if row[2] is not None:
+        return True, row[0], row[2] <= time.time()
+    return True, row[0], row[1] < time.time() - VIDEO_TTL
+
+
+def refresh_video(bassid, bassname, daily_quota=YOUTUBE_DAILY_QUOTA):
+    '''Look up the video of the bass on YouTube and store it. A search that is not in the cache
+    is only sent if the quota of the day has enough units left, and the units are given back
+    if the request does not reach the API. A failed lookup is stored too, with the time it can
+    be tried again, so the video page does not send it again on every view.
+    
+    Parameters
+    ----------
+    bassid: int
+        The id of the bass
+
+    bassname: string
+        The name of the bass
+
+    daily_quota: int
+        The quota units available per day
+    
+    Returns
+    -------
+    string
+        "found", "no video", "failed" if the request failed, or "quota" if the quota is used up
+    '''
+    query = youtube_search_url(bassname)
+    charged = query not in get_cache()
+    if charged and not spend_youtube_quota(YOUTUBE_SEARCH_COST, daily_quota):
+        return "quota"
+    conn = get_db()
+    try:
+        response = make_request_with_cache(query)
+    except requests.RequestException as error:
+        print("Failed", query.split("?")[0], error)
+        if charged and error.response is None:
+            refund_youtube_quota(YOUTUBE_SEARCH_COST)
+        now = time.time()
+        with conn:
+            row = conn.execute('SELECT Failures FROM Videos WHERE BassId = ?', (bassid,)).fetchone()
+            failures = row[0] + 1 if row is not None else 1
+            retry_at = now + min(VIDEO_RETRY_DELAY * 2 ** (failures - 1), VIDEO_TTL)
+            conn.execute('''
+                INSERT INTO Videos (BassId, VideoId, ResolvedAt, Failures, RetryAt) VALUES (?, NULL, ?, ?, ?)
+                ON CONFLICT (BassId) DO UPDATE SET Failures = excluded.Failures, RetryAt = excluded.RetryAt
+            ''', (bassid, now, failures, retry_at))
+        return "failed"
+    video_id = parse_youtube_video_id(response)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO Videos (BassId, VideoId, ResolvedAt, Failures, RetryAt) VALUES (?, ?, ?, 0, NULL)', (bassid, video_id, time.time()))
+    return "found" if video_id is not None else "no video"
+
+
+def prewarm_videos(max_workers=YOUTUBE_WORKERS, daily_quota=YOUTUBE_DAILY_QUOTA):
+    '''Look up ahead of time the videos of the active basses that were never looked up,
+    whose lookup is older than VIDEO_TTL, or whose failed lookup can be tried again,
+    so the video page does not wait for YouTube.
+    Basses left when the quota of the day is used up are looked up by the next run.
+    
+    Parameters
+    ----------
+    max_workers: int
+        The number of lookups sent at the same time
+
+    daily_quota: int
+        The quota units available per day
+    
+    Returns
+    -------
+    dict
+        The number of basses "found", "no video", "failed" and "quota"
+    '''
+    prepare_db()
+    basses = get_db().execute('''
+        SELECT Basses.BassId, ModelName
+        FROM Basses
+        LEFT OUTER JOIN Videos
+            ON Basses.BassId = Videos.BassId
+        WHERE Active = 1 AND (Videos.BassId IS NULL OR Videos.RetryAt <= ? OR (Videos.RetryAt IS NULL AND Videos.ResolvedAt < ?))
+    ''', (time.time(), time.time() - VIDEO_TTL)).fetchall()
+    report = {'found': 0, 'no video': 0, 'failed': 0, 'quota': 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as lookups:
+        for status in lookups.map(lambda bass: refresh_video(bass[0], bass[1], daily_quota), basses):
+            report[status] += 1
+    print("Pre-warmed videos:", report)
+    return report
+
+
+VIDEO_REFRESHER = ThreadPoolExecutor(max_workers=1)
+VIDEO_REFRESHING = set()
+VIDEO_REFRESHING_LOCK = threading.Lock()
+
+
+def request_video_refresh(bassid, bassname):
+    '''Look up the video of the bass in the background, unless it is already being looked up.
+    
+    Parameters
+    ----------
+    bassid: int
+        The id of the bass
+
+    bassname: string
+        The name of the bass
+    
+    Returns
+    -------
+    None
+    '''
+    with VIDEO_REFRESHING_LOCK:
+        if bassid in VIDEO_REFRESHING:
+            return
+        VIDEO_REFRESHING.add(bassid)
+
+    def run():
+        try:
+            refresh_video(bassid, bassname)
+        except Exception as error:
+            print("Failed to look up the video of", bassname, error)
+        finally:
+            with VIDEO_REFRESHING_LOCK:
+                VIDEO_REFRESHING.discard(bassid)
+
+    VIDEO_REFRESHER.submit(run)
+
+
+# Functions in this part are for generating the inerface
+@app.route('/')
+def index():
+    '''Generate the mainpage of my applicaiton.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    webpage
+        the mainpage.
+    '''
+    return render_template('index.html')
+
+
+@app.route('/handle_form', methods=['POST'])
+def handle_the_form():
+    '''Generate the results page when the search is sent.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    webpage
+        the results page.
+    '''
+    try:
+        keywords = request.form["keyword"]
+    except:
+        keywords = None
+    basstype = request.form["basstype"]
+    try:
+        lowestprice = request.form["lowestprice"]
+    except:
+        lowestprice = None
+    try:
+        highestprice = request.form["highestprice"]
+    except:
+        highestprice = None
+    try:
+        strings = request.form["strings"]
+    except:
+        strings = None
+    try:
+        sort = request.form["sort"]
+    except:
+        sort = "relevance"
+    try:
+        cursor = request.form["cursor"]
+    except:
+        cursor = None
+    try:
+        page = int(request.form["page"])
+    except:
+        page = 1
+    if parse_cursor(cursor, sort) is None:
+        page = 1
+    allbasses, total, next_cursor, facets, corrected = search_page(keywords, basstype, lowestprice, highestprice, strings, sort, cursor, page)
+    typed = keywords
+    if corrected is not None:
+        keywords = corrected
+    return render_template('results.html', 
+    keywords = keywords,
+    typed = typed,
+    corrected = corrected,
+    basstype = basstype,
+    lowestprice = lowestprice,
+    highestprice = highestprice,
+    strings = strings,
+    sort = sort,
+    page = page,
+    first = (page - 1) * PAGE_SIZE + 1,
+    total = total,
+    next_cursor = next_cursor,
+    facets = facets,
+    len = len(allbasses),
+    Basses = allbasses
+    )
+
+
+@app.route('/api/search', methods=['GET', 'POST'])
+def search_api():
+    '''Stream the basses that meet the criteria as JSON, one bass per line (NDJSON).
+    The arguments are the ones of the search form ("keyword", "basstype", "lowestprice",
+    "highestprice", "strings" and "sort"), plus "limit" and "cursor". Every bass comes with
+    its cursor, so a client can ask for the basses after any of them. The rows are written
+    as they are read from the database, without building the list of results first.
+    The response keeps its own connection from the pool until it is closed, since the one
+    of the request is given back when the view returns. Closing gives it back even if the
+    rows were never read, as for a HEAD request or a client that left.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    response
+        The basses, as described by bass_json, in the requested order.
+    '''
+    args = request.values
+    criteria = normalize_criteria(args.get("keyword"), args.get("basstype"), args.get("lowestprice"), args.get("highestprice"), args.get("strings"))
+    sort = args.get("sort", "relevance")
+    try:
+        limit = int(args["limit"])
+    except (KeyError, ValueError):
+        limit = None
+    ensure_db()
+    query, params = generate_query(*criteria, limit, sort, args.get("cursor"))
+    conn = DB_POOL.borrow()
+    try:
+        rows = conn.execute(query, params)
+    except Exception:
+        DB_POOL.give_back(conn)
+        raise
+
+    def generate():
+        for bass in rows:
+            yield json.dumps(bass_json(bass)) + "\n"
+
+    def close():
+        rows.close()
+        DB_POOL.give_back(conn)
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(close)
+    return response
+
+
+@app.route('/autocomplete')
+def autocomplete():
+    '''Complete the bass or brand name being typed in the search box.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    json
+        A list of up to AUTOCOMPLETE_LIMIT names having a word starting with the "q" argument.
+    '''
+    return jsonify(get_name_index().complete(request.args.get("q", "")))
+
+
+@app.route('/seevideo', methods=['POST'])
+def video_page():
+    '''Generate the video page.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    webpage
+        the video page.
+    '''
+    bassdata = None
+    try:
+        bassdata = find_a_bass_by_id(int(request.form["bassid"]))
+    except (KeyError, ValueError):
+        pass
+    if bassdata is None:
+        bassdata = find_a_bass(request.form.get("bassname", ""))
+    if bassdata is None:
+        abort(404)
+    bassname = bassdata[0]
+    resolved, youtubelink, stale = stored_video(bassdata[8])
+    if stale:
+        request_video_refresh(bassdata[8], bassname)
+    return render_template('seevideo.html',
+    bassname = bassname,
+    youtubelink = youtubelink,
+    pending = not resolved,
+    bassdata = bassdata)
+
+
+@app.route('/brands')
+def brands():
+    '''Generate the brands page.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    webpage
+        the brands page.
+    '''
+    allbrands = return_brands()
+    return render_template('Allbrands.html', 
+    len = len(allbrands),
+    Brands = allbrands
+    )
+
+
+@app.route('/brandanalysis')
+def brandanalysis():
+    '''Generate the brands analysis page.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    webpage
+        the brands analysis page.
+    '''
+    charts = get_charts()
+    return render_template('brandanalysis.html', plot=charts['countries'], plot2=charts['brands'], plot3=charts['prices'])
+
+# Functions below are for analyzing purpose
+def generate_conditions(keywords, basstype, lowestprice, highestprice, strings):
+    '''Generate the FROM and WHERE parts shared by the search query and the count query.
+    The criteria are always passed as parameters, so the SQL only depends on which criteria
+    are given. The few statements this gives are kept prepared in the statement cache of
+    each connection (DB_STATEMENT_CACHE). A price that is not a number is ignored.
+    The bass type and the number of strings are matched on the BodyType and StringCount
+    columns when they name a facet (see facet_filters), and on the category otherwise.
+    
+    Parameters
+    ----------
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
+    
+    Returns
+    -------
+    tuple
+        The FROM clause, the WHERE clause, the list of parameters, and the FTS5 MATCH expression (None if it is not a keyword search)
+    '''
+    from_bass = '''
+    FROM Basses
+    LEFT OUTER JOIN Brands 
+	ON Basses.Brand = Brands.BrandId
+    '''
+    querylist = ['Basses.Active = 1']
+    params = []
+    match = fts_match_expression(keywords) if FTS_ENABLED else None
+    if match:
+        from_bass = '''
+    FROM BassSearch
+    JOIN Basses
+        ON Basses.BassId = BassSearch.rowid
+    LEFT OUTER JOIN Brands 
+	ON Basses.Brand = Brands.BrandId
+    '''
+        querylist.append('BassSearch MATCH ?')
+        params.append(match)
+    elif keywords:
+        keywordquery = '''(ModelName LIKE ? ESCAPE '\\' OR Brands.BrandName LIKE ? ESCAPE '\\' OR OtherBrand LIKE ? ESCAPE '\\'
+        OR Styles LIKE ? ESCAPE '\\' OR Description LIKE ? ESCAPE '\\' OR Features LIKE ? ESCAPE '\\')'''
+        querylist.append(keywordquery)
+        params.extend([like_pattern(keywords)] * 6)
+    body_type, string_count, category_texts = facet_filters(basstype, strings)
+    if body_type is not None:
+        querylist.append('Basses.BodyType = ?')
+        params.append(body_type)
+    if string_count is not None:
+        querylist.append('Basses.StringCount = ?')
+        params.append(string_count)
+    for text in category_texts:
+        querylist.append("Category LIKE ? ESCAPE '\\'")
+        params.append(like_pattern(text))
+    lowestprice = price_bound(lowestprice)
+    if lowestprice is not None:
+        querylist.append('Price >= ?')
+        params.append(lowestprice)
+    highestprice = price_bound(highestprice)
+    if highestprice is not None:
+        querylist.append('Price <= ?')
+        params.append(highestprice)
+    
+    where = " WHERE " + " AND ".join(querylist)
+    return from_bass, where, params, match
+
+
+def facet_filters(basstype, strings):
+    '''Read the bass type and the number of strings of a search as facets. "Bass" is every
+    bass type, like on the search form. A bass type or a number of strings that is not a
+    facet, like "Fretless", is kept to be found in the category instead.
+    
+    Parameters
+    ----------
+    basstype: string or None
+        The type of the bass
+
+    strings: string or None
+        The number of the bass string, like "4 String" or "6+ Strings"
+    
+    Returns
+    -------
+    tuple
+        The body type or None, the number of strings or None, and the list of texts to find in the category
+    '''
+    body_type = None
+    string_count = None
+    category_texts = []
+    if basstype and basstype.strip().lower() != 'bass':
+        found = parse_category(basstype)[0]
+        if found is not None and found.lower() == basstype.strip().lower():
+            body_type = found
+        else:
+            category_texts.append(basstype)
+    if strings:
+        found = parse_category(strings)
+        if found[0] is None and found[1] is not None:
+            string_count = found[1]
+        else:
+            category_texts.append(strings)
+    return body_type, string_count, category_texts
+
+
+def facet_label(facet, value):
+    '''Write a facet value the way the search form sends it
+    
+    Parameters
+    ----------
+    facet: string
+        "basstype" or "strings"
+
+    value: string or int
+        The body type or the number of strings
+    
+    Returns
+    -------
+    string
+        The label, like "Electric" or "6+ String"
+    '''
+    if facet == 'strings':
+        return str(value) + ('+' if value >= MAX_STRING_COUNT else '') + ' String'
+    return value
+
+
+def facet_counts(keywords, basstype, lowestprice, highestprice, strings):
+    '''Count the basses of each body type and of each number of strings that meet the criteria.
+    Each facet is counted with the other criteria only, so the counts tell how many basses
+    choosing another value of the facet would find.
+    
+    Parameters
+    ----------
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
+    
+    Returns
+    -------
+    dict
+        For "basstype" and "strings", a dictionary with the labels of the values as keys and the number of basses as values, most basses first
+    '''
+    ensure_db()
+    cur = get_db().cursor()
+    facets = {}
+    for facet, column, criteria in (('basstype', 'Basses.BodyType', (keywords, '', lowestprice, highestprice, strings)),
+            ('strings', 'Basses.StringCount', (keywords, basstype, lowestprice, highestprice, ''))):
+        from_bass, where, params, match = generate_conditions(*criteria)
+        query = 'SELECT ' + column + ', COUNT(*)' + from_bass + where + ' AND ' + column + ' IS NOT NULL GROUP BY 1 ORDER BY 2 DESC, 1'
+        facets[facet] = collections.OrderedDict((facet_label(facet, value), count) for value, count in cur.execute(query, params))
+    return facets
+
+
+def like_pattern(text):
+    '''Make a LIKE pattern finding the text anywhere, with the wildcards in the text escaped.
+    
+    Parameters
+    ----------
+    text: string
+        The text to find
+    
+    Returns
+    -------
+    string
+        The pattern, to be used with ESCAPE '\\'
+    '''
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def price_bound(price):
+    '''Read a price typed in the search form.
+    
+    Parameters
+    ----------
+    price: string or None
+        The price
+    
+    Returns
+    -------
+    float or None
+        The price as a number. return None if it is empty or not a number.
+    '''
+    if price is None:
+        return None
+    try:
+        price = float(price)
+    except ValueError:
+        return None
+    if price != price:  # NaN
+        return None
+    return price
+
+
+def generate_query(keywords, basstype, lowestprice, highestprice, strings, limit=None, sort='relevance', cursor=None):
+    '''Generate a query to search with the basses table.
+    Keyword searches sorted by relevance are ranked by BM25, with a hit in the name or the brand
+    counting more than a hit in the description or the features.
+    Pages after the first one are found with the cursor of the last bass of the previous page,
+    so a page never scans over the basses before it.
+    
+    Parameters
+    ----------
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
+
+    limit: int or None
+        The maximum number of basses to return, None returns all of them
+
+    sort: string
+        One of the keys of SORT_ORDERS
+
+    cursor: string or None
+        The cursor of the last bass of the previous page, None for the first page
+    
+    Returns
+    -------
+    tuple
+        A SQL query used to search with basses table, and the list of parameters for it
+    '''
+    from_bass, where, params, match = generate_conditions(keywords, basstype, lowestprice, highestprice, strings)
+    key, direction = sort_key(sort, match)
+    query_bass = '''
+    SELECT Basses.ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Basses.Styles, Basses.Description, Basses.Features, PicURL, Basses.URL, Brands.BrandCountry, Basses.BassId, ''' + key + from_bass + where
+    last = parse_cursor(cursor, sort)
+    if last is not None:
+        condition, condition_params = keyset_condition(key, direction, last[0], last[1])
+        query_bass = query_bass + " AND " + condition
+        params = params + condition_params
+    query_bass = query_bass + " ORDER BY " + key + " " + direction
+    if key != "Basses.BassId":
+        query_bass = query_bass + ", Basses.BassId " + direction
+    if limit is not None:
+        query_bass = query_bass + " LIMIT ?"
+        params.append(int(limit))
+    return query_bass, params
+
+
+def generate_count_query(keywords, basstype, lowestprice, highestprice, strings):
+    '''Generate a query to count the basses meeting the provided criteria.
+    
+    Parameters
+    ----------
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
     
     Returns
     -------
-    instance
-        a brand instance
+    tuple
+        A SQL query counting the basses, and the list of parameters for it
     '''
-    response = make_request_with_cache(site_url)
-    soup = BeautifulSoup(response, 'html.parser')
-    try:
-        infobox = soup.find('table', class_='infobox vcard').find_all('tr')
-        info_dict = {}
-        website = ""
-        country = ""
-        for info in infobox:
-            try:
-                info_dict[info.find('th').text.lower()] = info.find('td')
-            except:
-                pass
-        if 'headquarters' in info_dict.keys():
-            country = info_dict['headquarters'].find('div', class_='country-name').text
-            if country is not None:
-                country = country.strip(',').strip('.').strip()
-        elif 'country' in info_dict.keys():
-            country = info_dict['country'].text
-            if country is not None:
-                country = country.strip(',').strip('.').strip()
-        if 'website' in info_dict.keys():
-            website = info_dict['website'].a['href']
-        else:
-            website = site_url
-    except:
-        website = site_url
-        country = None
+    from_bass, where, params, match = generate_conditions(keywords, basstype, lowestprice, highestprice, strings)
+    return "SELECT COUNT(*)" + from_bass + where, params
 
-    row_description = soup.find('div', id='mw-content-text').find('div', class_='mw-parser-output').find_all('p')
-    if 'coordinates' in str(row_description[0]):
-        description = row_description[1].text
-    else:
-        description = row_description[0].text
+
+def sort_key(sort, match):
+    '''Get the SQL expression and direction the results are sorted with.
     
-    return brand(brandname, country, description, website)
+    Parameters
+    ----------
+    sort: string
+        One of the keys of SORT_ORDERS, anything else sorts by relevance
 
+    match: string or None
+        The FTS5 MATCH expression of the search, None if it is not a keyword search
+    
+    Returns
+    -------
+    tuple
+        The SQL expression of the sort key and "ASC" or "DESC"
+    '''
+    if sort not in SORT_ORDERS or sort == 'relevance':
+        if match:
+            return "bm25(BassSearch, " + ", ".join(str(weight) for weight in SEARCH_WEIGHTS) + ")", "ASC"
+        return "Basses.BassId", "ASC"
+    return SORT_ORDERS[sort]
 
-# Functions in this part work with the database
-def create_db():
-    '''Create the databases for basses and brands
 
+def keyset_condition(key, direction, value, bassid):
+    '''Generate the condition selecting the basses after a cursor. Basses without a value
+    for the key come first in ascending order and last in descending order, like SQLite sorts them.
+    
     Parameters
     ----------
-    None
+    key: string
+        The SQL expression of the sort key
+
+    direction: string
+        "ASC" or "DESC"
 
+    value: float, string or None
+        The sort key of the last bass of the previous page
+
+    bassid: int
+        The id of the last bass of the previous page
+    
     Returns
-    ----------
-    None
+    -------
+    tuple
+        A SQL condition, and the list of parameters for it
     '''
+    if direction == "ASC":
+        if value is None:
+            return "((" + key + " IS NULL AND Basses.BassId > ?) OR " + key + " IS NOT NULL)", [bassid]
+        return "(" + key + " > ? OR (" + key + " = ? AND Basses.BassId > ?))", [value, value, bassid]
+    if value is None:
+        return "(" + key + " IS NULL AND Basses.BassId < ?)", [bassid]
+    return "(" + key + " < ? OR (" + key + " = ? AND Basses.BassId < ?) OR +" + key + " IS NULL)", [value, value, bassid]
 
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
-    drop_basses = 'DROP TABLE IF EXISTS "Basses"'
-    drop_brands = 'DROP TABLE IF EXISTS "Brands"'
-    create_basses = '''
-        CREATE TABLE IF NOT EXISTS "Basses" (
-            'BassId' INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
-            'ModelName' TEXT NOT NULL,
-            'Brand' INTEGER NOT NULL,
-            'OtherBrand' TEXT,
-            'Category' INTEGER NOT NULL,
-            'Price' DECIMAL,
-            'Styles' TEXT NOT NULL,
-            'Description' TEXT,
-            'Features' TEXT,
-            'PicURL' TEXT NOT NULL,
-            'URL' TEXT NOT NULL
-        )
-    '''
 
-    create_brands = '''
-        CREATE TABLE IF NOT EXISTS "Brands" (
-            "BrandId" INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
-            "BrandName" TEXT NOT NULL,
-            "BrandCountry" TEXT,
-            "BrandDescription" TEXT,
-            "URL" TEXT NOT NULL
-        );
+def make_cursor(bass):
+    '''Make the cursor pointing right after a bass of the search results.
+    
+    Parameters
+    ----------
+    bass: tuple
+        A row returned by return_results
+    
+    Returns
+    -------
+    string
+        The sort key and the id of the bass, separated by a colon
     '''
-
-    cur.execute(drop_basses)
-    cur.execute(drop_brands)
-    cur.execute(create_basses)
-    cur.execute(create_brands)
-    conn.commit()
-    conn.close()
+    if bass[10] is None:
+        return ":" + str(bass[9])
+    return str(bass[10]) + ":" + str(bass[9])
 
 
-def save_to_basses(bass):
-    '''Save the bass to database.
+def parse_cursor(cursor, sort):
+    '''Read a cursor made by make_cursor.
     
     Parameters
     ----------
-    bass: instance
-        A bass instance contains all the data to be stored
+    cursor: string or None
+        The cursor
+
+    sort: string
+        The sort order the cursor was made with
     
     Returns
     -------
-    None
-    '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
-    insert_basses = '''
-    INSERT INTO Basses
-    VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    tuple or None
+        The sort key and the id of the bass. return None if the cursor is empty or broken.
     '''
-    cur.execute(insert_basses, bass)
-    conn.commit()
+    if not cursor:
+        return None
+    value, _, bassid = cursor.rpartition(':')
+    try:
+        bassid = int(bassid)
+        if value == '':
+            value = None
+        elif sort != 'name':
+            value = float(value)
+    except ValueError:
+        return None
+    return (value, bassid)
 
 
-def save_to_brands(brand):
-    '''Save the brand to database.
+def fts_match_expression(keywords):
+    '''Turn the keywords into a FTS5 query. Every word has to appear in one of the indexed
+    fields, and every word also matches as a prefix, so "fend jazz" finds "Fender Jazz Bass".
     
     Parameters
     ----------
-    brand: instance
-        A brand instance contains all the data to be stored
+    keywords: string
+        The keywords typed by the user
     
     Returns
     -------
-    None
+    string or None
+        A FTS5 MATCH expression. return None if there is no word in the keywords.
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
-    insert_brands = '''
-    INSERT INTO Brands
-    VALUES (NULL, ?, ?, ?, ?)
+    if not keywords:
+        return None
+    terms = re.findall(r'\w+', keywords.lower())
+    if len(terms) < 1:
+        return None
+    return ' '.join('"' + term + '"*' for term in terms)
+
+
+def return_results(keywords, basstype, lowestprice, highestprice, strings, limit=None, sort='relevance', cursor=None):
+    '''Get the basses that meet the provided criteria, in the requested order
+    
+    Parameters
+    ----------
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
+
+    limit: int or None
+        The maximum number of basses to return, None returns all of them
+
+    sort: string
+        One of the keys of SORT_ORDERS
+
+    cursor: string or None
+        The cursor of the last bass of the previous page, None for the first page
+    
+    Returns
+    -------
+    list
+        A list of basses that meet the provided criteria
     '''
-    cur.execute(insert_brands, brand)
-    conn.commit()    
+    ensure_db()
+    cur = get_db().cursor()
+    query, params = generate_query(keywords, basstype, lowestprice, highestprice, strings, limit, sort, cursor)
+    results = cur.execute(query, params)
+    result_list=[]
+    for basses in results:
+        result_list.append(basses)
+    return result_list
 
-# Functions in this part are for generating the inerface
-@app.route('/')
-def index():
-    '''Generate the mainpage of my applicaiton.
+
+def count_results(keywords, basstype, lowestprice, highestprice, strings):
+    '''Count the basses that meet the provided criteria
     
     Parameters
     ----------
-    None
+    keywords: string
+        A keyword used to do a cross field search
+
+    basstype: string
+        The type of the bass
+
+    lowestprice: string
+        The lowest price of the basses that users would like to search for
+
+    highestprice: string
+        The highest price of the basses that users would like to search for
+    
+    strings: string
+        The number of the bass string
     
     Returns
     -------
-    webpage
-        the mainpage.
+    int
+        The number of basses that meet the provided criteria
     '''
-    return render_template('index.html')
+    ensure_db()
+    cur = get_db().cursor()
+    query, params = generate_count_query(keywords, basstype, lowestprice, highestprice, strings)
+    total = cur.execute(query, params).fetchone()[0]
+    return total
+
+
+class catalog_snapshot():
+    '''A copy of the active basses kept in memory, one array per column, to answer the
+    searches without keywords without asking the database.
+    The categories and the brands are stored as codes into lists of the distinct values.
+    The filters are turned into bitsets, one bit per bass, so a search is a few operations
+    on whole columns, and the basses are then read in the order of the requested sort.
+
+    Instance Attributes
+    -------------------
+    generation: int
+        The catalog generation the snapshot was loaded from
+
+    size: int
+        The number of basses
+
+    categories: list
+        The distinct categories
+
+    category_codes: array
+        The code of the category of each bass
+
+    brands: list
+        The distinct (brand name, brand country) pairs
+
+    brand_codes: array
+        The code of the brand of each bass
+
+    prices: array
+        The price of each bass, NaN if it has none
+
+    body_types: list
+        The distinct body types
+
+    body_codes: array
+        The code of the body type of each bass
+
+    string_counts: array
+        The number of strings of each bass, 0 if the category does not say
+
+    orders: dict
+        For each sort key, the positions of the basses in order and the list of their sort keys
+    '''
+
+    def __init__(self, generation):
+        self.generation = generation
+        query = '''
+        SELECT Basses.ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Basses.Styles, Basses.Description, Basses.Features, PicURL, Basses.URL, Brands.BrandCountry, Basses.BassId, Category, BodyType, StringCount
+        FROM Basses
+        LEFT OUTER JOIN Brands 
+            ON Basses.Brand = Brands.BrandId
+        WHERE Basses.Active = 1
+        ORDER BY Basses.BassId
+        '''
+        self.bassids = array.array('q')
+        self.prices = array.array('d')
+        self.category_codes = array.array('l')
+        self.brand_codes = array.array('l')
+        self.body_codes = array.array('l')
+        self.string_counts = array.array('l')
+        self.names, self.styles, self.descriptions, self.features, self.pictures, self.urls = [], [], [], [], [], []
+        self.categories = []
+        self.brands = []
+        category_index = {}
+        brand_index = {}
+        body_index = {None: 0}
+        integer_prices = []
+        for position, row in enumerate(get_db().execute(query)):
+            self.names.append(row[0])
+            self.styles.append(row[3])
+            self.descriptions.append(row[4])
+            self.features.append(row[5])
+            self.pictures.append(row[6])
+            self.urls.append(row[7])
+            self.bassids.append(row[9])
+            self.prices.append(float('nan') if row[2] is None else row[2])
+            if isinstance(row[2], int):
+                integer_prices.append(position)
+            self.brand_codes.append(brand_index.setdefault((row[1], row[8]), len(brand_index)))
+            self.category_codes.append(category_index.setdefault(row[10], len(category_index)))
+            self.body_codes.append(body_index.setdefault(row[11], len(body_index)))
+            self.string_counts.append(row[12] or 0)
+        self.size = len(self.bassids)
+        self.body_types = list(body_index)
+        self.brands = list(brand_index)
+        self.categories = list(category_index)
+        self.integer_prices = self.bitset_bytes(self.bitset(integer_prices))
+        positions = {}
+        for position, code in enumerate(self.category_codes):
+            positions.setdefault(code, []).append(position)
+        self.category_masks = [self.bitset(positions[code]) for code in range(len(self.categories))]
+        self.facet_masks = {'basstype': {}, 'strings': {}}
+        for facet, column, values in (('basstype', self.body_codes, self.body_types), ('strings', self.string_counts, None)):
+            positions = {}
+            for position, value in enumerate(column):
+                positions.setdefault(value, []).append(position)
+            for value, found in positions.items():
+                value = values[value] if values is not None else value
+                if value:
+                    self.facet_masks[facet][value] = self.bitset(found)
+        price_keys = [(0, 0.0, self.bassids[position]) if price != price else (1, price, self.bassids[position]) for position, price in enumerate(self.prices)]
+        name_keys = [(1, name, self.bassids[position]) for position, name in enumerate(self.names)]
+        id_keys = [(1, float(bassid), bassid) for bassid in self.bassids]
+        self.orders = {}
+        for key, keys in (('Price', price_keys), ('Basses.ModelName', name_keys), ('Basses.BassId', id_keys)):
+            order = array.array('l', sorted(range(self.size), key=keys.__getitem__))
+            self.orders[key] = (order, [keys[position] for position in order])
+
+    def bitset(self, positions):
+        '''Make a bitset with the bits of the positions set
+
+        Parameters
+        ----------
+        positions: iterable
+            The positions of the basses
+
+        Returns
+        -------
+        int
+            The bitset
+        '''
+        bits = bytearray((self.size + 7) // 8)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def bitset_bytes(self, mask):
+        '''Turn a bitset into bytes, so one bit can be read without shifting the whole bitset
+
+        Parameters
+        ----------
+        mask: int
+            The bitset
+
+        Returns
+        -------
+        bytes
+            The bitset, 8 basses per byte
+        '''
+        return mask.to_bytes((self.size + 7) // 8, 'little')
+
+    def category_mask(self, text):
+        '''Make the bitset of the basses whose category contains the text, ignoring the case
+        of ASCII letters like LIKE does
+
+        Parameters
+        ----------
+        text: string
+            The text to find in the category
+
+        Returns
+        -------
+        int
+            The bitset
+        '''
+        text = text.encode('utf-8').lower()
+        mask = 0
+        for code, category in enumerate(self.categories):
+            if text in category.encode('utf-8').lower():
+                mask |= self.category_masks[code]
+        return mask
+
+    def price_mask(self, lowestprice, highestprice):
+        '''Make the bitset of the basses with a price between the bounds
+
+        Parameters
+        ----------
+        lowestprice: float or None
+            The lowest price, None for no lowest price
+
+        highestprice: float or None
+            The highest price, None for no highest price
+
+        Returns
+        -------
+        int
+            The bitset
+        '''
+        order, keys = self.orders['Price']
+        start = bisect.bisect_left(keys, (1, float('-inf') if lowestprice is None else lowestprice))
+        end = bisect.bisect_right(keys, (1, float('inf') if highestprice is None else highestprice, float('inf')))
+        return self.bitset(order[start:end])
+
+    def search(self, basstype, lowestprice, highestprice, strings, limit=None, sort='relevance', cursor=None):
+        '''Get the basses that meet the criteria, the same as return_results without keywords
+
+        Parameters
+        ----------
+        basstype: string
+            The type of the bass
+
+        lowestprice: string
+            The lowest price of the basses that users would like to search for
+
+        highestprice: string
+            The highest price of the basses that users would like to search for
+
+        strings: string
+            The number of the bass string
+
+        limit: int or None
+            The maximum number of basses to return, None returns all of them
+
+        sort: string
+            One of the keys of SORT_ORDERS
+
+        cursor: string or None
+            The cursor of the last bass of the previous page, None for the first page
+
+        Returns
+        -------
+        tuple
+            The list of basses, in the same form as return_results, and the number of basses that meet the criteria
+        '''
+        mask = self.criteria_mask(basstype, lowestprice, highestprice, strings)
+        total = bin(mask).count('1')
+        selected = self.bitset_bytes(mask)
+        key, direction = sort_key(sort, None)
+        order, keys = self.orders[key]
+        last = parse_cursor(cursor, sort)
+        if direction == "ASC":
+            start = 0
+            if last is not None:
+                start = bisect.bisect_right(keys, (0, 0.0, last[1]) if last[0] is None else (1, last[0], last[1]))
+            positions = (order[index] for index in range(start, self.size))
+        else:
+            end = self.size
+            if last is not None:
+                end = bisect.bisect_left(keys, (0, 0.0, last[1]) if last[0] is None else (1, last[0], last[1]))
+            positions = (order[index] for index in range(end - 1, -1, -1))
+        results = []
+        for position in positions:
+            if limit is not None and len(results) >= limit:
+                break
+            if selected[position >> 3] >> (position & 7) & 1:
+                results.append(self.row(position, key))
+        return results, total
+
+    def criteria_mask(self, basstype, lowestprice, highestprice, strings):
+        '''Make the bitset of the basses that meet the criteria, the same as generate_conditions without keywords
+
+        Parameters
+        ----------
+        basstype: string
+            The type of the bass
+
+        lowestprice: string
+            The lowest price of the basses that users would like to search for
+
+        highestprice: string
+            The highest price of the basses that users would like to search for
+
+        strings: string
+            The number of the bass string
+
+        Returns
+        -------
+        int
+            The bitset
+        '''
+        mask = (1 << self.size) - 1
+        body_type, string_count, category_texts = facet_filters(basstype, strings)
+        if body_type is not None:
+            mask &= self.facet_masks['basstype'].get(body_type, 0)
+        if string_count is not None:
+            mask &= self.facet_masks['strings'].get(string_count, 0)
+        for text in category_texts:
+            mask &= self.category_mask(text)
+        lowestprice = price_bound(lowestprice)
+        highestprice = price_bound(highestprice)
+        if lowestprice is not None or highestprice is not None:
+            mask &= self.price_mask(lowestprice, highestprice)
+        return mask
+
+    def facet_counts(self, basstype, lowestprice, highestprice, strings):
+        '''Count the basses of each facet value, the same as facet_counts without keywords
+
+        Parameters
+        ----------
+        basstype: string
+            The type of the bass
+
+        lowestprice: string
+            The lowest price of the basses that users would like to search for
+
+        highestprice: string
+            The highest price of the basses that users would like to search for
+
+        strings: string
+            The number of the bass string
+
+        Returns
+        -------
+        dict
+            For "basstype" and "strings", a dictionary with the labels of the values as keys and the number of basses as values, most basses first
+        '''
+        facets = {}
+        for facet, criteria in (('basstype', ('', lowestprice, highestprice, strings)), ('strings', (basstype, lowestprice, highestprice, ''))):
+            mask = self.criteria_mask(*criteria)
+            counts = [(value, bin(mask & value_mask).count('1')) for value, value_mask in self.facet_masks[facet].items()]
+            counts = sorted([count for count in counts if count[1] > 0], key=lambda count: (-count[1], count[0]))
+            facets[facet] = collections.OrderedDict((facet_label(facet, value), count) for value, count in counts)
+        return facets
 
+    def row(self, position, key):
+        '''Build the row of a bass, the same as the rows of return_results
 
-@app.route('/handle_form', methods=['POST'])
-def handle_the_form():
-    '''Generate the results page when the search is sent.
+        Parameters
+        ----------
+        position: int
+            The position of the bass
+
+        key: string
+            The SQL expression of the sort key
+
+        Returns
+        -------
+        tuple
+            The row
+        '''
+        price = self.prices[position]
+        if price != price:
+            price = None
+        elif self.integer_prices[position >> 3] >> (position & 7) & 1:
+            price = int(price)
+        brand = self.brands[self.brand_codes[position]]
+        sort_value = {'Price': price, 'Basses.ModelName': self.names[position], 'Basses.BassId': self.bassids[position]}[key]
+        return (self.names[position], brand[0], price, self.styles[position], self.descriptions[position], self.features[position],
+            self.pictures[position], self.urls[position], brand[1], self.bassids[position], sort_value)
+
+
+def get_catalog(generation=None):
+    '''Get the snapshot of the catalog, loading it again if the catalog changed since it was loaded.
     
     Parameters
     ----------
-    None
+    generation: int or None
+        The catalog generation, if the caller already read it, None to read it
     
     Returns
     -------
-    webpage
-        the results page.
+    catalog_snapshot or None
+        The snapshot, None if CATALOG_SNAPSHOT is off
     '''
-    try:
-        keywords = request.form["keyword"]
-    except:
-        keywords = None
-    basstype = request.form["basstype"]
-    try:
-        lowestprice = request.form["lowestprice"]
-    except:
-        lowestprice = None
-    try:
-        highestprice = request.form["highestprice"]
-    except:
-        highestprice = None
-    try:
-        strings = request.form["strings"]
-    except:
-        strings = None
-    allbasses = return_results(keywords, basstype, lowestprice, highestprice, strings)
-    return render_template('results.html', 
-    keywords = keywords,
-    basstype = basstype,
-    strings = strings,
-    len = len(allbasses),
-    Basses = allbasses
-    )
+    global CATALOG
+    if not CATALOG_SNAPSHOT:
+        return None
+    if generation is None:
+        generation = catalog_generation()
+    with CATALOG_LOCK:
+        if CATALOG is None or CATALOG.generation != generation:
+            CATALOG = catalog_snapshot(generation)
+        return CATALOG
 
 
-@app.route('/seevideo', methods=['POST'])
-def video_page():
-    '''Generate the video page.
-    
-    Parameters
-    ----------
-    None
-    
-    Returns
-    -------
-    webpage
-        the video page.
+class name_index():
+    '''The names of the active basses and of their brands, indexed to correct misspelled
+    keywords and to complete the names being typed.
+    The words of the names are indexed by their trigrams, so a misspelled word can be
+    compared with the words sharing a trigram with it only. Every name is also listed once
+    for each of its words, starting from that word, in a sorted list, so the names containing
+    a word starting with the typed text are found with a binary search.
+
+    Instance Attributes
+    -------------------
+    generation: int
+        The catalog generation the index was built from
+
+    words: list
+        The distinct lowercase words of the names
+
+    trigram_words: dict
+        The numbers of the words having each trigram, with the trigrams as keys
+
+    prefixes: list
+        Sorted (lowercase text, name) tuples, the text being the name from one of its words on
+
+    starts: list
+        Sorted (lowercase name, name) tuples, to find the names starting with a text first
     '''
-    bassname = request.form["bassname"]
-    bassdata = find_a_bass(bassname)
-    youtubelink = get_youtube_video_url(bassname)
-    return render_template('seevideo.html',
-    bassname = bassname,
-    youtubelink = youtubelink,
-    bassdata = bassdata)
 
+    def __init__(self, generation):
+        self.generation = generation
+        query = '''
+        SELECT Basses.ModelName
+        FROM Basses
+        WHERE Basses.Active = 1
+        UNION
+        SELECT IFNULL(Brands.BrandName, OtherBrand)
+        FROM Basses
+        LEFT OUTER JOIN Brands 
+            ON Basses.Brand = Brands.BrandId
+        WHERE Basses.Active = 1
+        '''
+        names = [row[0] for row in get_db().execute(query) if row[0]]
+        self.words = sorted({word for name in names for word in re.findall(r'\w+', name.lower())})
+        self.word_trigrams = [trigrams(word) for word in self.words]
+        self.trigram_words = {}
+        for number, grams in enumerate(self.word_trigrams):
+            for gram in grams:
+                self.trigram_words.setdefault(gram, []).append(number)
+        prefixes = set()
+        for name in names:
+            name_words = name.split()
+            for start in range(len(name_words)):
+                prefixes.add((" ".join(name_words[start:]).lower(), name))
+        self.prefixes = sorted(prefixes)
+        self.prefix_keys = [prefix[0] for prefix in self.prefixes]
+        self.starts = sorted({(" ".join(name.split()).lower(), name) for name in names})
+        self.start_keys = [start[0] for start in self.starts]
 
-@app.route('/brands')
-def brands():
-    '''Generate the brands page.
+    def similar_word(self, word, threshold=FUZZY_THRESHOLD):
+        '''Find the word of the names most similar to a word
+
+        Parameters
+        ----------
+        word: string
+            A lowercase word
+
+        threshold: float
+            The lowest trigram similarity accepted, from 0 to 1
+
+        Returns
+        -------
+        string or None
+            The most similar word, None if no word is similar enough
+        '''
+        grams = trigrams(word)
+        shared = collections.Counter()
+        for gram in grams:
+            for number in self.trigram_words.get(gram, ()):
+                shared[number] += 1
+        best = None
+        best_similarity = threshold
+        for number, count in shared.items():
+            similarity = count / (len(grams) + len(self.word_trigrams[number]) - count)
+            if similarity > best_similarity or (similarity == best_similarity and best is None):
+                best = self.words[number]
+                best_similarity = similarity
+        return best
+
+    def correct(self, keywords, threshold=FUZZY_THRESHOLD):
+        '''Replace the keywords that are not a word of the names by the most similar word
+
+        Parameters
+        ----------
+        keywords: string
+            The keywords typed by the user
+
+        threshold: float
+            The lowest trigram similarity accepted, from 0 to 1
+
+        Returns
+        -------
+        string or None
+            The corrected keywords, None if no keyword was corrected
+        '''
+        known = set(self.words)
+        corrected = []
+        changed = False
+        for word in re.findall(r'\w+', keywords.lower()):
+            if word not in known and len(word) >= 3 and not word.isdigit():
+                similar = self.similar_word(word, threshold)
+                if similar is not None:
+                    word = similar
+                    changed = True
+            corrected.append(word)
+        return " ".join(corrected) if changed else None
+
+    def complete(self, text, limit=AUTOCOMPLETE_LIMIT):
+        '''Find the names having a word starting with the text
+
+        Parameters
+        ----------
+        text: string
+            The text being typed
+
+        limit: int
+            The maximum number of names returned
+
+        Returns
+        -------
+        list
+            The names, the ones starting with the text first
+        '''
+        text = " ".join(text.lower().split())
+        if not text:
+            return []
+        names = []
+        seen = set()
+        for keys, entries in ((self.start_keys, self.starts), (self.prefix_keys, self.prefixes)):
+            for index in range(bisect.bisect_left(keys, text), len(entries)):
+                prefix, name = entries[index]
+                if not prefix.startswith(text) or len(names) >= limit:
+                    break
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return names
+
+
+def trigrams(word):
+    '''Get the trigrams of a word, padded with spaces so the start and the end of the word count more.
     
     Parameters
     ----------
-    None
+    word: string
+        A lowercase word
     
     Returns
     -------
-    webpage
-        the brands page.
+    set
+        The trigrams
     '''
-    allbrands = return_brands()
-    return render_template('Allbrands.html', 
-    len = len(allbrands),
-    Brands = allbrands
-    )
+    word = "  " + word + " "
+    return {word[start:start + 3] for start in range(len(word) - 2)}
 
 
-@app.route('/brandanalysis')
-def brandanalysis():
-    '''Generate the brands analysis page.
+def get_name_index(generation=None):
+    '''Get the index of the names, building it again if the catalog changed since it was built.
     
     Parameters
     ----------
-    None
+    generation: int or None
+        The catalog generation, if the caller already read it, None to read it
     
     Returns
     -------
-    webpage
-        the brands analysis page.
+    name_index
+        The index
     '''
-    brands_country_dict = brands_country_analysis()
-    countries = []
-    counts = []
-    for key,value in brands_country_dict.items():
-        countries.append(key)
-        counts.append(value)
-    data = [go.Pie(labels=countries, values=counts, hole=.3)]
-    graphJSON = json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder)
-
-    bass_brands_dict = bass_by_brands()
-    brands = []
-    brandscounts = []
-    for key,value in bass_brands_dict.items():
-        brands.append(key)
-        brandscounts.append(value)
-    data2 = [go.Bar(x=brands, y=brandscounts)]
-    graphJSON2 = json.dumps(data2, cls=plotly.utils.PlotlyJSONEncoder)
-
-    bass_price_dict = bass_by_price()
-    basses = []
-    prices = []
-    brandsfortag = []
-    for key,value in bass_price_dict.items():
-        basses.append(key)
-        prices.append(value[1])
-        brandsfortag.append(value[0])
-    data3 = [go.Scatter(x=basses, y=prices, mode='markers', hovertext=basses)]
-    graphJSON3 = json.dumps(data3, cls=plotly.utils.PlotlyJSONEncoder)
+    global NAME_INDEX
+    if generation is None:
+        generation = catalog_generation()
+    with NAME_INDEX_LOCK:
+        if NAME_INDEX is None or NAME_INDEX.generation != generation:
+            NAME_INDEX = name_index(generation)
+        return NAME_INDEX
 
-    return render_template('brandanalysis.html', plot=graphJSON, plot2=graphJSON2, plot3=graphJSON3)
 
-# Functions below are for analyzing purpose
-def generate_query(keywords, basstype, lowestprice, highestprice, strings):
-    '''Generate a query to search with the basses table.
+def normalize_criteria(keywords, basstype, lowestprice, highestprice, strings):
+    '''Write the search criteria the same way when they find the same basses, so they
+    can be used as the key of the search cache. Missing criteria become empty strings,
+    the keywords are lowercased with single spaces, and the prices are written as numbers.
     
     Parameters
     ----------
-    keywords: string
+    keywords: string or None
         A keyword used to do a cross field search
 
-    basstype: string
+    basstype: string or None
         The type of the bass
 
-    lowestprice: string
+    lowestprice: string or None
         The lowest price of the basses that users would like to search for
 
-    highestprice: string
+    highestprice: string or None
         The highest price of the basses that users would like to search for
     
-    strings: string
+    strings: string or None
         The number of the bass string
     
     Returns
     -------
-    string
-        A SQL query used to search with basses table
-    '''
-    query_bass = '''
-    SELECT ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Styles, Description, Features, PicURL, Basses.URL, Brands.BrandCountry
-    FROM Basses
-    LEFT OUTER JOIN Brands 
-	ON Basses.Brand = Brands.BrandId
+    tuple
+        The normalized keywords, basstype, lowestprice, highestprice and strings
     '''
-    querylist = []
-    if len(keywords)>0:
-        keywordquery = '(ModelName LIKE "%' + keywords + '%" OR Brands.BrandName LIKE "%' + keywords + '%" OR OtherBrand LIKE "%' + keywords + '%" OR Styles LIKE "%' + keywords + '%" OR Description LIKE "%' + keywords + '%" OR Features LIKE "%' + keywords + '%")'
-        querylist.append(keywordquery)
-    if len(basstype)>0:
-        querylist.append('Category LIKE "%' + basstype + '%"')
-    if len(lowestprice)>0:
-        querylist.append('Price >=' + str(lowestprice))
-    if len(highestprice)>0:
-        querylist.append('Price <=' + str(highestprice))
-    if strings is not None:
-        if len(strings)>0:
-            querylist.append('Category LIKE "%' + strings + '%"')
-    
-    if len(querylist)>0:
-        i = 0
-        for query in querylist:
-            if i == 0:
-                query_bass = query_bass + " WHERE " + query
-                i += 1
-            else:
-                query_bass = query_bass + " AND " + query
-    return query_bass
+    keywords = " ".join((keywords or "").split()).lower()
+    prices = []
+    for price in (lowestprice, highestprice):
+        price = (price or "").strip()
+        try:
+            number = float(price)
+            price = str(int(number)) if number.is_integer() else str(number)
+        except ValueError:
+            pass
+        prices.append(price)
+    return keywords, (basstype or "").strip(), prices[0], prices[1], (strings or "").strip()
 
 
-def return_results(keywords, basstype, lowestprice, highestprice, strings):
-    '''Get the basses that meet the provided criteria
+def search_page(keywords, basstype, lowestprice, highestprice, strings, sort='relevance', cursor=None, page=1, generation=None):
+    '''Get a page of the basses that meet the provided criteria, the number of them, and the
+    cursor of the next page. Searches are looked up in SEARCH_CACHE by their normalized
+    criteria first, and the results found are saved in it. Searches without keywords are
+    answered from the catalog snapshot when CATALOG_SNAPSHOT is on. When keywords find
+    nothing, the misspelled ones are corrected with the name index and the search is done again.
     
     Parameters
     ----------
-    keywords: string
+    keywords: string or None
         A keyword used to do a cross field search
 
-    basstype: string
+    basstype: string or None
         The type of the bass
 
-    lowestprice: string
+    lowestprice: string or None
         The lowest price of the basses that users would like to search for
 
-    highestprice: string
+    highestprice: string or None
         The highest price of the basses that users would like to search for
     
-    strings: string
+    strings: string or None
         The number of the bass string
+
+    sort: string
+        One of the keys of SORT_ORDERS
+
+    cursor: string or None
+        The cursor of the last bass of the previous page, None for the first page
+
+    page: int
+        The number of the page
+
+    generation: int or None
+        The catalog generation, if the caller already read it, None to read it
     
     Returns
     -------
-    list
-        A list of basses that meet the provided criteria
+    tuple
+        The list of basses of the page, the number of basses that meet the criteria, the cursor
+        of the next page or None, the facet counts (see facet_counts), and the corrected
+        keywords or None if they were not corrected
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
-    query = generate_query(keywords, basstype, lowestprice, highestprice, strings)
-    results = cur.execute(query)
-    conn.commit()
-    result_list=[]
-    for basses in results:
-        result_list.append(basses)
-    return result_list
+    criteria = normalize_criteria(keywords, basstype, lowestprice, highestprice, strings)
+    key = criteria + (sort, cursor or "", page)
+    if generation is None:
+        generation = catalog_generation()
+    results = SEARCH_CACHE.get(key, generation)
+    if results is not None:
+        return results
+    catalog = get_catalog(generation) if not criteria[0] else None
+    if catalog is not None:
+        allbasses, total = catalog.search(*criteria[1:], PAGE_SIZE, sort, cursor)
+        facets = catalog.facet_counts(*criteria[1:])
+    else:
+        allbasses = return_results(*criteria, PAGE_SIZE, sort, cursor)
+        total = count_results(*criteria)
+        facets = facet_counts(*criteria)
+    next_cursor = None
+    if len(allbasses) == PAGE_SIZE and page * PAGE_SIZE < total:
+        next_cursor = make_cursor(allbasses[-1])
+    results = (allbasses, total, next_cursor, facets, None)
+    if total == 0 and criteria[0] and not cursor:
+        corrected = get_name_index(generation).correct(criteria[0])
+        if corrected is not None:
+            results = search_page(corrected, *criteria[1:], sort, generation=generation)[:4] + (corrected,)
+    SEARCH_CACHE.put(key, generation, results)
+    return results
+
+
+def bass_json(bass):
+    '''Turn a row of the search results into a dictionary for the JSON API
+    
+    Parameters
+    ----------
+    bass: tuple
+        A row returned by return_results
+    
+    Returns
+    -------
+    dict
+        The id, name, brand, brand country, price, styles, description, features, picture URL
+        and URL of the bass, and the cursor pointing right after it
+    '''
+    return {
+        "id": bass[9],
+        "name": bass[0],
+        "brand": bass[1],
+        "brand_country": bass[8],
+        "price": bass[2],
+        "styles": bass[3],
+        "description": bass[4],
+        "features": bass[5],
+        "picture": bass[6],
+        "url": bass[7],
+        "cursor": make_cursor(bass),
+    }
 
 
 def find_a_bass(bassname):
-    '''Get a bass with it's name
+    '''Get a bass with it's name, with the index on ModelName. Used by the links made
+    before the results page posted the id of the bass.
     
     Parameters
     ----------
@@ -760,24 +4336,46 @@ def find_a_bass(bassname):
     
     Returns
     -------
-    list
-        A list of data for the bass
+    list or None
+        A list of data for the bass, the same as find_a_bass_by_id. return None if there is no bass with this name.
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
+    cur = get_db().cursor()
     querybase = '''
-    SELECT ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Styles, Description, Features, PicURL, Basses.URL
+    SELECT ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Styles, Description, Features, PicURL, Basses.URL, Basses.BassId
     FROM Basses
     LEFT OUTER JOIN Brands 
 	ON Basses.Brand = Brands.BrandId
     '''
-    query = querybase + 'WHERE ModelName = "' + bassname + '"'
-    results = cur.execute(query)
-    conn.commit()
-    result= list(results)[0]
+    query = querybase + 'WHERE ModelName = ? ORDER BY Basses.Active DESC LIMIT 1'
+    result = cur.execute(query, (bassname,)).fetchone()
     return result
 
 
+def find_a_bass_by_id(bassid):
+    '''Get a bass with it's id
+    
+    Parameters
+    ----------
+    bassid: int
+        The id of the bass
+    
+    Returns
+    -------
+    list or None
+        The name, brand, price, styles, description, features, picture URL, URL and id of the bass.
+        return None if there is no bass with this id.
+    '''
+    cur = get_db().cursor()
+    query = '''
+    SELECT ModelName, IFNULL(Brands.BrandName, OtherBrand), Price, Styles, Description, Features, PicURL, Basses.URL, Basses.BassId
+    FROM Basses
+    LEFT OUTER JOIN Brands 
+	ON Basses.Brand = Brands.BrandId
+    WHERE Basses.BassId = ?
+    '''
+    return cur.execute(query, (bassid,)).fetchone()
+
+
 def return_brands():
     '''Get all of the brands in brands table
     
@@ -790,22 +4388,20 @@ def return_brands():
     list
         A list of brands
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
+    cur = get_db().cursor()
     query = '''
     SELECT BrandName, BrandCountry, BrandDescription, URL
     FROM Brands
     '''
     results = cur.execute(query)
-    conn.commit()
     result_list=[]
     for brands in results:
         result_list.append(brands)
     return result_list
 
 
-def return_brand_countries():
-    '''Get all of the countries the brands bassed
+def brands_country_analysis():
+    '''Analyze through how many bass brands are in each countries
     
     Parameters
     ----------
@@ -814,24 +4410,22 @@ def return_brand_countries():
     Returns
     -------
     dict
-        A dictionary with the countries as keys, and all values is None
+        A dictionary with countries as keys, and the number of the brands headquartered in the country as values
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
+    cur = get_db().cursor()
     query = '''
-    SELECT DISTINCT Brands.BrandCountry
+    SELECT IFNULL(CountryNames.Normalized, IFNULL(Brands.BrandCountry, 'N/A')), COUNT(*)
     FROM Brands
+    LEFT OUTER JOIN CountryNames
+        ON Brands.BrandCountry = CountryNames.Country
+    GROUP BY 1
+    ORDER BY 2 DESC
     '''
-    results = cur.execute(query)
-    conn.commit()
-    result_list=[]
-    for country in results:
-        result_list.append(country[0])
-    return dict.fromkeys(result_list)
+    return dict(cur.execute(query))
 
 
-def return_bass_brands():
-    '''Get all of the brands who have their basses selling in Guitar Center
+def bass_by_brands():
+    '''Analyze through how many bass in the online store are made by each brands
     
     Parameters
     ----------
@@ -840,26 +4434,27 @@ def return_bass_brands():
     Returns
     -------
     dict
-        A dictionary with the brands as keys, and all values is None
+        A dictionary with brands as keys, and the number of the basses in the online store as values. Sorted by the number of the basses
     '''
-    conn = sqlite3.connect('bassdb.sqlite')
-    cur = conn.cursor()
+    cur = get_db().cursor()
     query = '''
-    SELECT DISTINCT IFNULL(Brands.BrandName, OtherBrand)
+    SELECT IFNULL(Brands.BrandName, OtherBrand), COUNT(*)
     FROM Basses
     LEFT OUTER JOIN Brands 
         ON Basses.Brand = Brands.BrandId
+    WHERE Basses.Active = 1
+    GROUP BY 1
+    HAVING COUNT(*) > ?
+    ORDER BY 2 DESC
     '''
-    results = cur.execute(query)
-    conn.commit()
-    result_list=[]
-    for brand in results:
-        result_list.append(brand[0])
-    return dict.fromkeys(result_list)
+    return collections.OrderedDict(cur.execute(query, (MIN_BRAND_BASSES,)))
 
 
-def brands_country_analysis():
-    '''Analyze through how many bass brands are in each countries
+def get_charts():
+    '''Get the JSON of the charts of the brands analysis page. The charts are built once for
+    each catalog generation and kept in memory and in the Charts table, so they are only
+    built again after the basses or the brands change. The stored charts are only used if they
+    were built with the current CHART_VERSION, kept in the CatalogMeta table.
     
     Parameters
     ----------
@@ -868,45 +4463,31 @@ def brands_country_analysis():
     Returns
     -------
     dict
-        A dictionary with countries as keys, and the number of the brands headquartered in the country as values
+        The JSON of the "countries", "brands" and "prices" charts
     '''
-    allbrands = return_brands()
-    US_list = ["United States of America", "US", "USA", "American"]
-    UK_list = ["England", "UK"]
-    country_dict = return_brand_countries()
-
-    for brand in allbrands:
-        if brand[1] in country_dict.keys():
-            if country_dict[brand[1]] is None:
-                country_dict[brand[1]] = 0
-            else:
-                country_dict[brand[1]] = country_dict[brand[1]] + 1
-    combinelist = []
-    for key,value in country_dict.items():
-        if key in US_list:
-            country_dict["United States"] += value
-            combinelist.append(key)
-        if key in UK_list:
-            country_dict["United Kingdom"] += value
-            combinelist.append(key)
-        if key is None:
-            country_dict[""] += value
-            combinelist.append(key)
-    for combined in combinelist:
-        del country_dict[combined]
-    country_dict["N/A"] = country_dict[""]
-    del country_dict[""]
-    blanklist = []
-    for key,value in country_dict.items():
-        if value == 0:
-            blanklist.append(key)
-    for blank in blanklist:
-        del country_dict[blank]
-    return country_dict
+    global CHART_CACHE
+    generation = catalog_generation()
+    cached = CHART_CACHE
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    conn = get_db()
+    charts = dict(conn.execute('''
+        SELECT Name, JSON FROM Charts
+        WHERE Generation = ? AND (SELECT Value FROM CatalogMeta WHERE Name = 'ChartVersion') = ?
+    ''', (generation, CHART_VERSION)))
+    if len(charts) < 3:
+        charts = build_charts()
+        with conn:
+            conn.execute('DELETE FROM Charts')
+            conn.executemany('INSERT INTO Charts (Name, Generation, JSON) VALUES (?, ?, ?)',
+                [(name, generation, chart) for name, chart in charts.items()])
+            conn.execute("INSERT OR REPLACE INTO CatalogMeta (Name, Value) VALUES ('ChartVersion', ?)", (CHART_VERSION,))
+    CHART_CACHE = (generation, charts)
+    return charts
 
 
-def bass_by_brands():
-    '''Analyze through how many bass in the online store are made by each brands
+def build_charts():
+    '''Build the charts of the brands analysis page from the database
     
     Parameters
     ----------
@@ -915,25 +4496,38 @@ def bass_by_brands():
     Returns
     -------
     dict
-        A dictionary with brands as keys, and the number of the basses in the online store as values. Sorted by the number of the basses
+        The JSON of the "countries", "brands" and "prices" charts
     '''
-    allbasses = return_results("", "", "", "", "")
-    brand_dict = return_bass_brands()
-    for bass in allbasses:
-        if bass[1] in brand_dict.keys():
-            if brand_dict[bass[1]] is None:
-                brand_dict[bass[1]] = 0
-            else:
-                brand_dict[bass[1]] = brand_dict[bass[1]] + 1
-    blanklist = []
-    for key,value in brand_dict.items():
-        if value <= 5:
-            blanklist.append(key)
-    for blank in blanklist:
-        del brand_dict[blank]
-    brand_dict = sorted(brand_dict.items(), key=lambda kv: kv[1], reverse=True)
-    brand_dict = collections.OrderedDict(brand_dict)
-    return brand_dict
+    brands_country_dict = brands_country_analysis()
+    countries = []
+    counts = []
+    for key,value in brands_country_dict.items():
+        countries.append(key)
+        counts.append(value)
+    data = [go.Pie(labels=countries, values=counts, hole=.3)]
+    graphJSON = json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder)
+
+    bass_brands_dict = bass_by_brands()
+    brands = []
+    brandscounts = []
+    for key,value in bass_brands_dict.items():
+        brands.append(key)
+        brandscounts.append(value)
+    data2 = [go.Bar(x=brands, y=brandscounts)]
+    graphJSON2 = json.dumps(data2, cls=plotly.utils.PlotlyJSONEncoder)
+
+    bass_price_dict = bass_by_price()
+    basses = []
+    prices = []
+    brandsfortag = []
+    for key,value in bass_price_dict.items():
+        basses.append(key)
+        prices.append(value[1])
+        brandsfortag.append(value[0])
+    data3 = [go.Scatter(x=basses, y=prices, mode='markers', hovertext=basses)]
+    graphJSON3 = json.dumps(data3, cls=plotly.utils.PlotlyJSONEncoder)
+
+    return {'countries': graphJSON, 'brands': graphJSON2, 'prices': graphJSON3}
 
 
 def bass_by_price():
@@ -960,15 +4554,25 @@ def bass_by_price():
 if __name__ == "__main__":
 # UNCOMMENT THE PART BELOW TO GET THE UPDATED BASS AND BRAND INFORMATION
     # create_db()
-    # CACHE_DICT = open_cache()
-    # bass_url_dict = get_basses()
+    # CACHE_STORE = open_cache()
+    # bass_url_dict = get_basses(max_workers=CRAWL_WORKERS)
+    # brand_url_dict = get_brands()
+    # save_many_to_brands(get_brands_instance(keys, values).info() for keys,values in brand_url_dict.items())
+    # save_many_to_basses(get_bass_infos(list(bass_url_dict.values()), CRAWL_WORKERS, PARSE_WORKERS))
+    # CACHE_STORE.flush()
+    # print(CACHE_STORE.stats())
+    # print(FETCHER.stats())
+# OR UNCOMMENT THE PART BELOW TO REFRESH THE BASS AND BRAND INFORMATION WITHOUT EMPTYING THE DATABASE
+    # prepare_db()
+    # bass_url_dict = get_basses(max_workers=CRAWL_WORKERS)
     # brand_url_dict = get_brands()
-    # for keys,values in brand_url_dict.items():
-    #     save_to_brands(get_brands_instance(keys, values).info())
-    # for keys,values in bass_url_dict.items():
-    #     try:
-    #         save_to_basses(get_bass_instance(values).info())
-    #     except:
-    #         pass
+    # refresh_brands(get_brands_instance(keys, values).info() for keys,values in brand_url_dict.items())
+    # refresh_basses(list(bass_url_dict.values()), CRAWL_WORKERS, PARSE_WORKERS)
+# OR UNCOMMENT THE LINE BELOW TO REFRESH THE BASSES WITH A CRAWL THAT CAN BE STOPPED AND RESUMED
+    # run_crawl()
+# UNCOMMENT THE LINE BELOW TO LOOK UP THE VIDEOS OF THE BASSES AHEAD OF TIME
+    # prewarm_videos()
+    prepare_db()
+    get_catalog()
     app.run(debug=True)
 
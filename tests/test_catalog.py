@@ -0,0 +1,61 @@
+'''Check that the searches answered from the catalog snapshot find what the SQL search finds,
+on a copy of the bundled database.
+
+Run from the folder of searcher.py:
+    python -m unittest discover tests
+'''
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import searcher
+
+BASSTYPES = ['', 'Bass', 'Electric', 'Acoustic', 'Upright', 'Left Handed']
+PRICES = [('', ''), ('500', ''), ('', '1000'), ('300', '1500.50'), ('abc', '')]
+STRINGS = ['', '4 String', '5 String', '6+ String']
+
+
+class catalog_test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        filename = os.path.join(cls.folder, 'bassdb.sqlite')
+        shutil.copy(os.path.join(os.path.dirname(searcher.__file__), searcher.DB_FILENAME), filename)
+        searcher.configure_db(filename)
+        searcher.ensure_db()
+        cls.catalog = searcher.get_catalog()
+
+    @classmethod
+    def tearDownClass(cls):
+        searcher.configure_db()
+        shutil.rmtree(cls.folder)
+
+    def criteria(self):
+        for basstype, (lowestprice, highestprice), strings in itertools.product(BASSTYPES, PRICES, STRINGS):
+            yield searcher.normalize_criteria('', basstype, lowestprice, highestprice, strings)
+
+    def test_pages(self):
+        for criteria, sort in itertools.product(self.criteria(), searcher.SORT_ORDERS):
+            with self.subTest(criteria=criteria, sort=sort):
+                cursor = None
+                while True:
+                    found, total = self.catalog.search(*criteria[1:], searcher.PAGE_SIZE, sort, cursor)
+                    self.assertEqual(found, searcher.return_results(*criteria, searcher.PAGE_SIZE, sort, cursor))
+                    self.assertEqual(total, searcher.count_results(*criteria))
+                    if len(found) < searcher.PAGE_SIZE:
+                        break
+                    cursor = searcher.make_cursor(found[-1])
+
+    def test_facet_counts(self):
+        for criteria in self.criteria():
+            with self.subTest(criteria=criteria):
+                self.assertEqual(self.catalog.facet_counts(*criteria[1:]), searcher.facet_counts(*criteria))
+
+
+if __name__ == '__main__':
+    unittest.main()
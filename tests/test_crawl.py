@@ -0,0 +1,115 @@
+'''Crawl a local stand-in of the online shop serving the saved pages in tests/fixtures.
+
+Run from the folder of searcher.py:
+    python -m unittest discover tests
+'''
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import searcher
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class fixture_handler(http.server.BaseHTTPRequestHandler):
+    '''Serves the listing page for "/Bass.gc", whatever the query, and the product page
+    saved as products/<name>.html for "/<name>.gc". Counts the requests it answers.
+    '''
+    requests = 0
+
+    def do_GET(self):
+        fixture_handler.requests += 1
+        path = self.path.split('?')[0]
+        if path == '/Bass.gc':
+            filename = os.path.join(FIXTURES, 'listing.html')
+        else:
+            filename = os.path.join(FIXTURES, 'products', path.strip('/').replace('.gc', '.html'))
+        if not os.path.isfile(filename):
+            self.send_response(404)
+            self.end_headers()
+            return
+        with open(filename, 'rb') as page:
+            body = page.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class crawl_test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), fixture_handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        searcher.configure_db(os.path.join(self.folder, 'bassdb.sqlite'))
+        searcher.CACHE_STORE = searcher.cache_store(os.path.join(self.folder, 'cache.sqlite'))
+        searcher.create_db()
+        searcher.save_to_brands(['Ibanez', 'Japan', 'Ibanez basses', 'https://www.ibanez.com'])
+        searcher.save_to_brands(['Fender', 'United States', 'Fender basses', 'https://www.fender.com'])
+
+    def tearDown(self):
+        searcher.CACHE_STORE.conn.close()
+        searcher.CACHE_STORE = None
+        searcher.configure_db()
+        shutil.rmtree(self.folder)
+
+    def test_get_basses(self):
+        bass_urls = searcher.get_basses(self.base_url, max_workers=2)
+        self.assertEqual(sorted(bass_urls.values()), [
+            self.base_url + '/Fender-Player-Jazz-Bass.gc',
+            self.base_url + '/Ibanez-SR305E.gc',
+            self.base_url + '/Kala-U-Bass.gc',
+        ])
+
+    def test_get_bass_infos(self):
+        bass_urls = searcher.get_basses(self.base_url)
+        infos = searcher.get_bass_infos(sorted(bass_urls.values()), max_workers=2, parse_workers=1)
+        self.assertEqual([info[:5] for info in infos], [
+            ['Fender Player Jazz Bass Polar White', 2, None, '4 String Electric Bass', 749.99],
+            ['Ibanez SR305E 5-String Electric Bass Black', 1, None, '5 String Electric Bass', 1049.99],
+            ['Kala U-Bass Fretted Acoustic Bass Natural', 0, 'Kala', 'Fretted Acoustic Bass', 299.0],
+        ])
+        self.assertEqual(infos[0][5], 'Polar White, 3-Color Sunburst')
+        self.assertEqual([info[10:] for info in infos], [['Electric', 4], ['Electric', 5], ['Acoustic', None]])
+
+    def test_cache_is_used(self):
+        searcher.get_basses(self.base_url)
+        sent = fixture_handler.requests
+        searcher.get_basses(self.base_url)
+        self.assertEqual(fixture_handler.requests, sent)
+
+    def test_run_crawl(self):
+        job = searcher.crawl_job(os.path.join(self.folder, 'crawl.sqlite'))
+        report = searcher.run_crawl(job, self.base_url, max_workers=2, parse_workers=1)
+        self.assertEqual(report, {'parsed': 4, 'deactivated': 0})
+        rows = searcher.get_db().execute('SELECT ModelName, Brand, OtherBrand, Price, Active FROM Basses ORDER BY ModelName').fetchall()
+        self.assertEqual(rows, [
+            ('Fender Player Jazz Bass Polar White', 2, None, 749.99, 1),
+            ('Ibanez SR305E 5-String Electric Bass Black', 1, None, 1049.99, 1),
+            ('Kala U-Bass Fretted Acoustic Bass Natural', 0, 'Kala', 299.0, 1),
+        ])
+        job.conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
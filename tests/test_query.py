@@ -0,0 +1,76 @@
+'''Check that the search criteria are bound as parameters, on a copy of the bundled database.
+
+Run from the folder of searcher.py:
+    python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import searcher
+
+
+class query_test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        filename = os.path.join(cls.folder, 'bassdb.sqlite')
+        shutil.copy(os.path.join(os.path.dirname(searcher.__file__), searcher.DB_FILENAME), filename)
+        searcher.configure_db(filename)
+        searcher.ensure_db()
+
+    @classmethod
+    def tearDownClass(cls):
+        searcher.configure_db()
+        shutil.rmtree(cls.folder)
+
+    def tearDown(self):
+        searcher.FTS_ENABLED = None
+        searcher.ensure_db()
+
+    def test_same_statement_for_other_values(self):
+        first = searcher.generate_query('jazz', 'Electric', '100', '900', '4 String', 30, 'price_asc')
+        second = searcher.generate_query('precision bass', 'Acoustic', '250.50', '3000', '5 String', 30, 'price_asc')
+        self.assertEqual(first[0], second[0])
+        self.assertNotEqual(first[1], second[1])
+
+    def test_prices_compared_as_numbers(self):
+        found = searcher.return_results('', '', '900', '1000', '')
+        prices = [bass[2] for bass in found]
+        self.assertTrue(len(prices) > 0)
+        self.assertTrue(all(900 <= price <= 1000 for price in prices))
+        expected = searcher.get_db().execute('SELECT COUNT(*) FROM Basses WHERE Active = 1 AND Price BETWEEN 900 AND 1000').fetchone()[0]
+        self.assertEqual(len(found), expected)
+
+    def test_price_not_a_number_is_ignored(self):
+        self.assertEqual(searcher.count_results('', '', 'cheap', '', ''), searcher.count_results('', '', '', '', ''))
+
+    def test_quotes_are_text(self):
+        fender = {bass[9] for bass in searcher.return_results('fender', '', '', '', '')}
+        found = {bass[9] for bass in searcher.return_results("fender' OR '1'='1", '', '', '', '')}
+        self.assertTrue(found <= fender)
+        self.assertLess(len(fender), searcher.count_results('', '', '', '', ''))
+        self.assertEqual(searcher.return_results('', "Electric' OR 1=1 --", '', '', ''), [])
+        self.assertIsNone(searcher.find_a_bass("' OR 1=1 --"))
+
+    def test_like_wildcards_are_text(self):
+        searcher.FTS_ENABLED = False
+        rows = searcher.get_db().execute('''
+            SELECT ModelName, IFNULL(Brands.BrandName, OtherBrand), Styles, Description, Features
+            FROM Basses
+            LEFT OUTER JOIN Brands
+                ON Basses.Brand = Brands.BrandId
+            WHERE Active = 1
+        ''').fetchall()
+        for text in ['%', '_', '100%']:
+            with self.subTest(text=text):
+                expected = sum(1 for row in rows if any(field and text in field for field in row))
+                self.assertEqual(searcher.count_results(text, '', '', '', ''), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()